@@ -3,94 +3,171 @@ from http.server import HTTPServer
 
 from urllib.parse import urlparse, parse_qs
 
+import html
+import time
+import logging
+import secrets
+import threading
 import webbrowser
-import requests
-import random
-import string
 
-from ticktick import TickTickApi
-
-
-class AuthData:
-    client_id = ""
-    client_secret = ""
-    port = ""
-    access_token = ""
-
-    def get_redirect_uri():
-        return f"http://127.0.0.1:{AuthData.port}"
-
-    def init(client_id, client_secret, port):
-        AuthData.client_id = client_id
-        AuthData.client_secret = client_secret
-        AuthData.port = int(port)
+logger = logging.getLogger(__name__)
 
 
 class AuthRequestHandler(BaseHTTPRequestHandler):
 
-    def fetch_token(self, code, client_id, client_secret, redirect_uri):
-        response = TickTickApi.request_access_token(
-            client_id, client_secret, redirect_uri, code
-        )
+    def log_message(self, format, *args):
+        logger.debug(format % args)
 
-        json = response.json()
-        return json.get("access_token")
+    def _respond(self, response_code, msg):
+        body = bytes(
+            "<html><head><title>Token creation</title></head>"
+            f"<body><p>{html.escape(msg)}</p></body></html>",
+            "utf-8",
+        )
+        self.send_response(response_code)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     def do_GET(self):
+        manager = self.server.manager
 
         # parse code from url
         parsed_url = urlparse(self.path)
         args = parse_qs(parsed_url.query)
-        code = args["code"][0]
+
+        # stray requests, e.g. for /favicon.ico, are ignored
+        if parsed_url.path != "/" or not ("code" in args or "error" in args):
+            self._respond(404, "Not found.")
+            return
+
+        # the callback has to answer the request made by this flow
+        if args.get("state", [""])[0] != manager.state:
+            logger.warning("Ignored an authorization callback with a wrong state")
+            self._respond(400, "Invalid state, please try again from Ulauncher.")
+            return
+
+        if "error" in args:
+            manager.finish(error=args["error"][0])
+            self._respond(403, f"Authorization denied: {args['error'][0]}")
+            return
 
         # fetch token from api
-        response_code = 0
-        msg = ""
-        
+        manager.set_status(AuthManager.EXCHANGING)
         try:
-            AuthData.access_token = self.fetch_token(
-                code,
-                AuthData.client_id,
-                AuthData.client_secret,
-                AuthData.get_redirect_uri(),
+            response = manager.api.request_access_token(
+                manager.client_id,
+                manager.client_secret,
+                manager.redirect_uri,
+                args["code"][0],
             )
-            response_code = 200
-            msg = "Successfully connected to your TickTick account! Continue in Ulauncher."
+            response.raise_for_status()
+            token = response.json()
+            if not token.get("access_token"):
+                raise ValueError("The response lacks an access token")
         except Exception as err:
-            response_code = 403
-            msg = f"Something went wrong:\n{err}"
-
-        self.send_response(response_code)
-        self.send_header("Content-Type", "text/html")
-        self.end_headers()
-        self.wfile.write(
-            bytes("<html><head><title>Token creation</title></head>", "utf-8")
+            manager.finish(error=str(err))
+            self._respond(403, f"Something went wrong:\n{err}")
+            return
+
+        manager.finish(token=token)
+        self._respond(
+            200,
+            "Successfully connected to your TickTick account! Continue in Ulauncher.",
         )
-        self.wfile.write(bytes("<body>", "utf-8"))
-        self.wfile.write(bytes(f"<p>{msg}</p>", "utf-8"))
-        self.wfile.write(bytes("</body></html>", "utf-8"))
 
 
 class AuthManager:
 
-    STATE_LENGTH = 6
-
-    def generate_alphanum(length):
-        return "".join(random.choices(string.ascii_letters + string.digits, k=length))
-
-    def run(client_id, client_secret, port):
-
-        AuthData.init(client_id, client_secret, port)
-
-        state = AuthManager.generate_alphanum(AuthManager.STATE_LENGTH)
-
-        auth_uri = TickTickApi.get_authorization_uri(
-            AuthData.client_id, AuthData.get_redirect_uri(), state
+    WAITING = "waiting"
+    EXCHANGING = "exchanging"
+    DONE = "done"
+    FAILED = "failed"
+
+    # seconds to wait for the browser callback
+    TIMEOUT = 300
+
+    # seconds between checks of the deadline
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, api, client_id, client_secret, port, on_done=None):
+        self.api = api
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.port = int(port)
+        # called on the flow's thread once it is done or failed
+        self.on_done = on_done
+
+        self.state = secrets.token_urlsafe(16)
+        self.status = None
+        self.error = ""
+        self.token = dict()
+        self.deadline = None
+
+        self._finished = threading.Event()
+        self._thread = None
+
+    @property
+    def redirect_uri(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def set_status(self, status):
+        self.status = status
+
+    def finish(self, token=None, error=""):
+        if self._finished.is_set():
+            return
+        self.token = token or dict()
+        self.error = error
+        self.status = self.DONE if token else self.FAILED
+        self._finished.set()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0) if self.deadline else 0
+
+    def start(self, timeout=TIMEOUT):
+        # the callback server is bound right away, so that a port in use is
+        # reported before the browser opens
+        try:
+            server = HTTPServer(("127.0.0.1", self.port), AuthRequestHandler)
+        except OSError as err:
+            self.finish(error=f"Cannot listen on port {self.port}: {err}")
+            self._done()
+            return
+
+        server.manager = self
+        server.timeout = self.POLL_INTERVAL
+        self.deadline = time.monotonic() + timeout
+        self.status = self.WAITING
+
+        self._thread = threading.Thread(
+            target=self._run, args=(server,), name="auth", daemon=True
         )
+        self._thread.start()
 
+        auth_uri = self.api.get_authorization_uri(
+            self.client_id, self.redirect_uri, self.state
+        )
         webbrowser.open(auth_uri)
 
-        with HTTPServer(("127.0.0.1", AuthData.port), AuthRequestHandler) as server:
-            server.handle_request()
-
-        return AuthData.access_token
+    def cancel(self):
+        self.finish(error="Cancelled")
+
+    def _run(self, server):
+        with server:
+            while not self._finished.is_set():
+                if time.monotonic() >= self.deadline:
+                    self.finish(error="Timed out waiting for the authorization")
+                    break
+                server.handle_request()
+        self._done()
+
+    def _done(self):
+        if self.error:
+            logger.warning(f"Authorization failed: {self.error}")
+        if self.on_done:
+            self.on_done(self)
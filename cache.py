@@ -0,0 +1,107 @@
+import time
+import logging
+import threading
+
+from storage import get_path, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectCache:
+
+    FILENAME = "projects.json"
+
+    DEFAULT_REFRESH_INTERVAL = 900
+
+    def __init__(self, on_refresh, filename=None):
+        self.on_refresh = on_refresh
+        self.filename = filename if filename else get_path(self.FILENAME)
+        self.refresh_interval = self.DEFAULT_REFRESH_INTERVAL
+
+        self.projects = []
+        self.etag = None
+        self.last_modified = None
+        self.timestamp = 0
+
+        self._api = None
+        self._thread = None
+        self._wakeup = threading.Event()
+
+    def load(self):
+        data = read_json(self.filename, dict())
+        self.projects = data.get("projects", [])
+        self.etag = data.get("etag")
+        self.last_modified = data.get("last_modified")
+        self.timestamp = data.get("timestamp", 0)
+        logger.debug(f'Loaded {len(self.projects)} projects from "{self.filename}"')
+        return self.projects
+
+    def _save(self):
+        write_json(
+            self.filename,
+            {
+                "projects": self.projects,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "timestamp": self.timestamp,
+            },
+        )
+
+    def set_refresh_interval(self, interval):
+        try:
+            self.refresh_interval = max(int(interval), 1)
+        except (TypeError, ValueError):
+            logger.warning(f'Invalid refresh interval "{interval}"')
+            return
+        self._wakeup.set()
+
+    def refresh(self):
+        response = self._api.get_projects(
+            etag=self.etag, last_modified=self.last_modified
+        )
+        self.timestamp = time.time()
+
+        if response.status_code == 304:
+            logger.debug("Projects are unchanged")
+        elif response.ok:
+            self.projects = response.json()
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+            self.on_refresh(self.projects)
+        else:
+            logger.warning(f"Cannot fetch projects: {response.status_code}")
+            return
+
+        self._save()
+
+    def revalidate(self, api, reset=False):
+        # schedules a refresh on the background thread, reset drops the
+        # validators if the cached list belongs to another access token
+        self._api = api
+        if reset:
+            self.etag = None
+            self.last_modified = None
+            self.timestamp = 0
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            due = self.timestamp + self.refresh_interval - time.time()
+            if due > 0 and self._wakeup.wait(due):
+                self._wakeup.clear()
+                continue
+
+            if self._api.access_token:
+                try:
+                    self.refresh()
+                except Exception as err:
+                    logger.warning(f"Cannot refresh projects: {err}")
+                    self.timestamp = time.time()
+            else:
+                self._wakeup.wait()
+                self._wakeup.clear()
@@ -0,0 +1,108 @@
+import bisect
+import datetime
+import time
+
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+
+# units of "in N <unit>" and their canonical name
+IN_UNITS = {
+    "day": "days",
+    "days": "days",
+    "week": "weeks",
+    "weeks": "weeks",
+    "wk": "weeks",
+    "wks": "weeks",
+}
+
+MAX_IN_DAYS = 365
+MAX_IN_WEEKS = 52
+
+
+class ClockContext:
+
+    __slots__ = ("today", "timezone", "relative", "_keys")
+
+    def __init__(self, today, timezone):
+        self.today = today
+        self.timezone = timezone
+
+        # every relative keyword resolved to its date
+        day = datetime.timedelta(days=1)
+        relative = dict()
+        relative["today"] = relative["tod"] = today
+        relative["tomorrow"] = relative["tom"] = today + day
+        for i, name in enumerate(WEEKDAYS):
+            # the next one, a week ahead if it is today
+            relative[name] = today + ((i - today.weekday() - 1) % 7 + 1) * day
+        relative["next week"] = relative["next wk"] = (
+            today + (7 - today.weekday()) * day
+        )
+        relative["next month"] = relative["next mon"] = datetime.date(
+            today.year if today.month < 12 else today.year + 1,
+            today.month % 12 + 1,
+            1,
+        )
+        relative["next year"] = relative["next yr"] = datetime.date(
+            today.year + 1, 1, 1
+        )
+        relative["in 1 day"] = today + day
+        for n in range(1, MAX_IN_DAYS + 1):
+            relative[f"in {n} days"] = today + n * day
+        relative["in 1 week"] = today + 7 * day
+        for n in range(1, MAX_IN_WEEKS + 1):
+            relative[f"in {n} weeks"] = today + 7 * n * day
+        self.relative = relative
+
+        # the keywords suggested while typing, abbreviations and the plurals
+        # of a single day or week are parsed but left out
+        hidden = ("tod", "tom", "next wk", "next mon", "next yr")
+        hidden += ("in 1 days", "in 1 weeks")
+        self._keys = sorted(key for key in relative if key not in hidden)
+
+    def complete(self, prefix, max_matches=0):
+        # returns (keyword, date) of the keywords that strictly extend prefix
+        matches = []
+        prefix = prefix.lower()
+        i = bisect.bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            key = self._keys[i]
+            i += 1
+            if len(key) == len(prefix):
+                continue
+            matches.append((key, self.relative[key]))
+            if len(matches) == max_matches:
+                break
+        return matches
+
+
+class Clock:
+
+    def __init__(self):
+        self._key = None
+        self._context = None
+
+    def _local(self):
+        # returns the local date and the timezone name
+        local = time.localtime()
+        return local[:3], local.tm_zone
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def context(self):
+        # the context is rebuilt once per day and whenever the timezone
+        # changes
+        key = self._local()
+        if key != self._key:
+            (y, m, d), timezone = key
+            self._context = ClockContext(datetime.date(y, m, d), timezone)
+            self._key = key
+        return self._context
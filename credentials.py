@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import threading
+
+from storage import get_path, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager:
+
+    FILENAME = "token.json"
+
+    # plain text file of earlier versions, read once for migration
+    LEGACY_FILENAME = "access_token"
+
+    # tokens expiring within this many seconds are treated as expired
+    EXPIRY_MARGIN = 300
+
+    # seconds after which a successful request no longer vouches for the
+    # token
+    VALIDATION_INTERVAL = 3600
+
+    def __init__(self, filename=None):
+        self.filename = filename if filename else get_path(self.FILENAME)
+
+        self.access_token = ""
+        self.token_type = ""
+        self.scope = ""
+        self.expires_at = None
+        self.obtained_at = None
+        self.validated_at = None
+        # None while unknown, False once the API rejected the token
+        self.valid = None
+
+        self._lock = threading.Lock()
+        self._validating = False
+
+    def load(self):
+        data = read_json(self.filename)
+        if data is None:
+            data = dict(access_token=self._read_legacy())
+        with self._lock:
+            self.access_token = data.get("access_token", "")
+            self.token_type = data.get("token_type", "")
+            self.scope = data.get("scope", "")
+            self.expires_at = data.get("expires_at")
+            self.obtained_at = data.get("obtained_at")
+            self.validated_at = data.get("validated_at")
+            self.valid = data.get("valid")
+        return self.access_token
+
+    def _read_legacy(self):
+        filename = get_path(self.LEGACY_FILENAME)
+        if not os.path.isfile(filename):
+            return ""
+        logger.debug(f'Read access token from "{filename}"')
+        with open(filename, "r") as f:
+            return f.read().strip()
+
+    def _save(self):
+        # the token is only readable by the user
+        write_json(
+            self.filename,
+            {
+                "access_token": self.access_token,
+                "token_type": self.token_type,
+                "scope": self.scope,
+                "expires_at": self.expires_at,
+                "obtained_at": self.obtained_at,
+                "validated_at": self.validated_at,
+                "valid": self.valid,
+            },
+            mode=0o600,
+        )
+
+    def update(self, token):
+        # token is the response of the /oauth/token exchange
+        now = time.time()
+        with self._lock:
+            self.access_token = token.get("access_token", "")
+            self.token_type = token.get("token_type", "")
+            self.scope = token.get("scope", "")
+            expires_in = token.get("expires_in")
+            self.expires_at = now + int(expires_in) if expires_in else None
+            self.obtained_at = now
+            self.validated_at = None
+            self.valid = None
+            self._save()
+
+    def set(self, access_token):
+        # a token set without metadata, e.g. by clearing it
+        with self._lock:
+            if access_token == self.access_token:
+                return
+            self.access_token = access_token
+            self.token_type = ""
+            self.scope = ""
+            self.expires_at = None
+            self.obtained_at = time.time() if access_token else None
+            self.validated_at = None
+            self.valid = None
+            self._save()
+
+    def expired(self):
+        return (
+            self.expires_at is not None
+            and time.time() > self.expires_at - self.EXPIRY_MARGIN
+        )
+
+    def usable(self):
+        # whether requests are worth sending, without a round trip
+        return (
+            bool(self.access_token) and self.valid is not False and not self.expired()
+        )
+
+    def problem(self):
+        # a description of why the token is not usable
+        if not self.access_token:
+            return "No access token"
+        if self.valid is False:
+            return "Access token rejected"
+        if self.expired():
+            return "Access token expired"
+        return None
+
+    def observe(self, response):
+        # called with every response of the API, a request sent with the
+        # token validates it at no extra cost
+        authorization = response.request.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer "):
+            return
+        if authorization[len("Bearer ") :] != self.access_token:
+            return
+
+        if response.status_code == 401:
+            valid = False
+        elif response.ok or response.status_code == 304:
+            valid = True
+        else:
+            return
+
+        now = time.time()
+        with self._lock:
+            # the file is only written when something worth keeping changed
+            stale = (
+                self.validated_at is None
+                or now - self.validated_at > self.VALIDATION_INTERVAL
+            )
+            if valid == self.valid and not stale:
+                return
+            if valid is False:
+                logger.warning("The access token was rejected")
+            self.valid = valid
+            self.validated_at = now
+            self._save()
+
+    def validate(self, api):
+        # checks the token on a background thread unless a recent request
+        # already did
+        if not self.access_token or self.expired() or self._validating:
+            return
+        if (
+            self.validated_at is not None
+            and time.time() - self.validated_at < self.VALIDATION_INTERVAL
+        ):
+            return
+
+        def run():
+            try:
+                api.get_projects()
+            except Exception as err:
+                logger.warning(f"Cannot validate the access token: {err}")
+            finally:
+                self._validating = False
+
+        self._validating = True
+        threading.Thread(target=run, name="validate", daemon=True).start()
@@ -0,0 +1,77 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    pass
+
+
+class LatestDispatcher:
+
+    def __init__(self, handler, name=None):
+        # handler(item, generation) runs on a worker thread. Items submitted
+        # while it is busy replace each other, only the latest one is handled.
+        self.handler = handler
+        self.name = name
+        self.generation = 0
+        # number of items replaced before they were handled
+        self.coalesced = 0
+
+        self._pending = None
+        self._busy = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, item):
+        with self._condition:
+            self.generation += 1
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (self.generation, item)
+            self._condition.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+            return self.generation
+
+    def flush(self, timeout=None):
+        # waits until every submitted item is handled or superseded, returns
+        # False on timeout
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._pending is None and not self._busy, timeout
+            )
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def check(self, generation):
+        # called by the handler between expensive steps, abandons work for
+        # superseded items
+        if generation != self.generation:
+            raise Cancelled()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                generation, item = self._pending
+                self._pending = None
+                self._busy = True
+
+            try:
+                self.handler(item, generation)
+            except Cancelled:
+                logger.debug(f"Abandoned superseded item {generation}")
+            except Exception:
+                logger.exception(f"Cannot handle item {generation}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
@@ -0,0 +1,242 @@
+import heapq
+
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8
+BONUS_FIRST_CHAR = 8
+BONUS_CONSECUTIVE = 12
+MAX_GAP_PENALTY = 8
+
+# shorter names rank higher on equal matches
+LENGTH_PENALTY_DIVISOR = 8
+
+
+def boundaries(key):
+    # positions at which a word starts
+    return frozenset(
+        i
+        for i, c in enumerate(key)
+        if c.isalnum() and (i == 0 or not key[i - 1].isalnum())
+    )
+
+
+def _align(query, key, word_starts, prefer_boundary):
+    positions = []
+    pos = 0
+    for c in query:
+        i = key.find(c, pos)
+        if i < 0:
+            return None
+        if prefer_boundary and (not positions or i != positions[-1] + 1):
+            # jump ahead to the next word starting with c, if any
+            for j in word_starts.get(c, ()):
+                if j >= i:
+                    i = j
+                    break
+        positions.append(i)
+        pos = i + 1
+    return positions
+
+
+def _score(positions, key, bounds):
+    score = -(len(key) // LENGTH_PENALTY_DIVISOR)
+    prev = -2
+    for i in positions:
+        score += SCORE_MATCH
+        if i in bounds:
+            score += BONUS_BOUNDARY
+        if i == 0:
+            score += BONUS_FIRST_CHAR
+        if i == prev + 1:
+            score += BONUS_CONSECUTIVE
+        elif prev >= 0:
+            score -= min(i - prev - 1, MAX_GAP_PENALTY)
+        prev = i
+    return score
+
+
+class FuzzyCandidate:
+
+    __slots__ = ("key", "value", "order", "bounds", "word_starts")
+
+    def __init__(self, key, value, order):
+        self.key = key
+        self.value = value
+        self.order = order
+        self.bounds = boundaries(key)
+        self.word_starts = dict()
+        for i in sorted(self.bounds):
+            self.word_starts.setdefault(key[i], []).append(i)
+
+    def score(self, query):
+        # subsequence match in the spirit of fzf, trying both a greedy and a
+        # word-boundary preferring alignment. The latter may jump past the
+        # characters needed later on and fail where the greedy one matched.
+        best = None
+        for prefer_boundary in (False, True):
+            positions = _align(query, self.key, self.word_starts, prefer_boundary)
+            if positions is None:
+                if not prefer_boundary:
+                    return None
+                continue
+            score = _score(positions, self.key, self.bounds)
+            if best is None or score > best:
+                best = score
+        return best
+
+
+class FuzzyMatcher:
+
+    def __init__(self, items):
+        # items are (case-folded key, value), candidates are ordered by
+        # length, so the achievable score only decreases while scanning
+        self.candidates = [
+            FuzzyCandidate(key, value, order)
+            for order, (key, value) in enumerate(
+                sorted(items, key=lambda item: (len(item[0]), item[0]))
+            )
+        ]
+
+        # bitsets of the candidates containing a character, starting with
+        # it, having a word start with it and containing a pair of adjacent
+        # characters, they bound the score of a candidate without scoring it
+        positions = dict()
+        firsts = dict()
+        starts = dict()
+        pairs = dict()
+        for index, candidate in enumerate(self.candidates):
+            key = candidate.key
+            for c in set(key):
+                positions.setdefault(c, []).append(index)
+            if key:
+                firsts.setdefault(key[0], []).append(index)
+            for c in set(key[i] for i in candidate.bounds):
+                starts.setdefault(c, []).append(index)
+            for pair in set(zip(key, key[1:])):
+                pairs.setdefault(pair, []).append(index)
+        self.char_bits = self._bitsets(positions)
+        self.first_bits = self._bitsets(firsts)
+        self.start_bits = self._bitsets(starts)
+        self.pair_bits = self._bitsets(pairs)
+        self.all_bits = (1 << len(self.candidates)) - 1
+        self.by_value = {candidate.value: candidate for candidate in self.candidates}
+
+    def _bitsets(self, indices):
+        bitsets = dict()
+        for key, values in indices.items():
+            bits = bytearray(b"0" * len(self.candidates))
+            for index in values:
+                bits[-1 - index] = ord("1")
+            bitsets[key] = int(bits, 2)
+        return bitsets
+
+    def _bounds(self, query, mask):
+        # splits mask into groups of candidates by an upper bound of their
+        # score without the length penalty. A query character gets the
+        # boundary bonus only if it starts a word of the candidate and the
+        # consecutive bonus only if the candidate contains it right after
+        # the previous one, both only if it follows a separator.
+        c = query[0]
+        first = mask & self.first_bits.get(c, 0)
+        start = mask & self.start_bits.get(c, 0) & ~first
+        groups = dict()
+        for bits, bonus in (
+            (first, BONUS_FIRST_CHAR + (BONUS_BOUNDARY if c.isalnum() else 0)),
+            (start, BONUS_BOUNDARY),
+            (mask & ~first & ~start, 0),
+        ):
+            if bits:
+                groups[SCORE_MATCH + bonus] = bits
+
+        for prev, c in zip(query, query[1:]):
+            start_bits = self.start_bits.get(c, 0)
+            pair_bits = self.pair_bits.get((prev, c), 0)
+            both = c.isalnum() and not prev.isalnum()
+            split = dict()
+            for bound, bits in groups.items():
+                start = bits & start_bits
+                pair = bits & pair_bits
+                if both:
+                    parts = (
+                        (start & pair, BONUS_BOUNDARY + BONUS_CONSECUTIVE),
+                        (pair & ~start, BONUS_CONSECUTIVE),
+                        (start & ~pair, BONUS_BOUNDARY),
+                    )
+                else:
+                    parts = (
+                        (pair, BONUS_CONSECUTIVE),
+                        (start & ~pair, BONUS_BOUNDARY),
+                    )
+                rest = bits & ~start & ~pair
+                for part, bonus in parts + ((rest, 0),):
+                    if part:
+                        bound_part = bound + SCORE_MATCH + bonus
+                        split[bound_part] = split.get(bound_part, 0) | part
+            groups = split
+        return groups
+
+    def search(self, query, max_matches=0, bonus=None):
+        # returns the values of the best matches, best first. bonus maps the
+        # values of some candidates to a number added to their score.
+        query = query.casefold()
+        entries = self._top(query, max_matches)
+        if bonus:
+            entries = self._boost(query, entries, max_matches, bonus)
+        return [value for _, _, value in sorted(entries, reverse=True)]
+
+    def _boost(self, query, entries, max_matches, bonus):
+        # a candidate without a bonus keeps its score, so only the top-k and
+        # the candidates with a bonus can make the boosted top-k
+        boosted = {
+            value: (score + bonus.get(value, 0), order, value)
+            for score, order, value in entries
+        }
+        for value, extra in bonus.items():
+            candidate = self.by_value.get(value)
+            if value in boosted or candidate is None or candidate.key == query:
+                continue
+            score = candidate.score(query)
+            if score is not None:
+                boosted[value] = (score + extra, -candidate.order, value)
+
+        entries = sorted(boosted.values(), reverse=True)
+        return entries[:max_matches] if max_matches else entries
+
+    def _top(self, query, max_matches):
+        mask = self.all_bits
+        for c in set(query):
+            mask &= self.char_bits.get(c, 0)
+            if not mask:
+                return []
+
+        # groups are visited by decreasing bound and their candidates by
+        # increasing length, ties are ranked by length and name in the same
+        # order, so a group is left as soon as none of its remaining
+        # candidates could beat the current top-k
+        heap = []
+        groups = self._bounds(query, mask) if query else {0: mask}
+        for bound in sorted(groups, reverse=True):
+            # groups are mostly sparse, their lowest bit is taken off in turn
+            bits = groups[bound]
+            while bits:
+                low = bits & -bits
+                bits ^= low
+                candidate = self.candidates[low.bit_length() - 1]
+
+                if max_matches and len(heap) == max_matches:
+                    penalty = len(candidate.key) // LENGTH_PENALTY_DIVISOR
+                    if (bound - penalty, -candidate.order) < heap[0][:2]:
+                        break
+                if candidate.key == query:
+                    continue
+
+                score = candidate.score(query)
+                if score is None:
+                    continue
+
+                entry = (score, -candidate.order, candidate.value)
+                if not max_matches or len(heap) < max_matches:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        return heap
@@ -0,0 +1,368 @@
+import os
+import re
+import csv
+import sys
+import time
+import hashlib
+import logging
+import argparse
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import ProjectCache
+from credentials import TokenManager
+from parser import StringParser, PRIORITY_VALUES
+from storage import get_path, read_json, write_json
+from ticktick import TickTickApi
+from worker import SubmissionWorker, is_transient
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("text", "todo", "markdown", "csv")
+
+# "- [ ] task", checked items are done already
+_CHECKBOX_RE = re.compile(r"\s*[-*+]\s+\[([ xX])\]\s+(.*)")
+
+_TODO_PRIORITY_RE = re.compile(r"\(([A-Z])\)\s+")
+
+_TODO_DATE_RE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}\s+")
+
+TODO_PRIORITIES = {"A": "high", "B": "medium", "C": "low"}
+
+
+def detect_format(filename):
+    name = os.path.basename(filename).lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".md", ".markdown")):
+        return "markdown"
+    if name in ("todo.txt", "done.txt"):
+        return "todo"
+    return "text"
+
+
+def from_text(line):
+    return line.strip()
+
+
+def from_markdown(line):
+    match = _CHECKBOX_RE.fullmatch(line.rstrip())
+    if not match or match.group(1) != " ":
+        return ""
+    return match.group(2).strip()
+
+
+def from_todo(line):
+    # (A) 2024-01-31 Call mom +Family @phone due:2024-02-01
+    line = line.strip()
+    if not line or line.startswith("x "):
+        return ""
+
+    words = []
+    project = None
+
+    match = _TODO_PRIORITY_RE.match(line)
+    if match:
+        line = line[match.end() :]
+        priority = TODO_PRIORITIES.get(match.group(1))
+        if priority:
+            words.append(f"!{priority}")
+
+    # the creation date
+    match = _TODO_DATE_RE.match(line)
+    if match:
+        line = line[match.end() :]
+
+    for word in line.split():
+        if word.startswith("+") and len(word) > 1:
+            project = project or word[1:]
+        elif word.startswith("@") and len(word) > 1:
+            words.append(f"#{word[1:]}")
+        elif word.startswith("due:"):
+            words.append(word[len("due:") :])
+        else:
+            words.append(word)
+
+    # a project name extends to the end of the query
+    if project:
+        words.append(f"~{project}")
+    return " ".join(words)
+
+
+def from_csv(row):
+    # columns are matched case-insensitively, only the title is required
+    row = {
+        (key or "").strip().lower(): (value or "").strip() for key, value in row.items()
+    }
+
+    words = [row.get("title") or row.get("task") or ""]
+    for tag in re.split(r"[\s,]+", row.get("tags", "")):
+        if tag:
+            words.append(f"#{tag.lstrip('#')}")
+    if row.get("priority"):
+        words.append(f"!{row['priority'].lstrip('!').lower()}")
+    for key in ("due", "date", "time"):
+        if row.get(key):
+            words.append(row[key])
+    if row.get("project"):
+        words.append(f"~{row['project'].lstrip('~')}")
+    # a quoted value may span several lines
+    return " ".join(words).replace("\n", " ")
+
+
+def read_queries(f, format):
+    # yields (line number, query) pairs, lines without a task yield an empty
+    # query, the file is never held in memory
+    if format == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, from_csv(row)
+        return
+
+    convert = {"text": from_text, "todo": from_todo, "markdown": from_markdown}
+    for number, line in enumerate(f, 1):
+        yield number, convert[format](line)
+
+
+class Checkpoint:
+
+    # seconds between writes of the progress
+    INTERVAL = 2
+
+    def __init__(self, filename, source):
+        self.filename = filename
+        self.source = source
+        # every line up to this one is done, lines after it that are done
+        # already are kept in done
+        self.line = 0
+        self.done = set()
+
+        self._read = 0
+        self._pending = set()
+        self._saved_at = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        data = read_json(self.filename) if self.filename else None
+        if data and data.get("source") == self.source:
+            self.line = data.get("line", 0)
+            self.done = set(data.get("done", []))
+        return self.line
+
+    def skip(self, number):
+        return number <= self.line or number in self.done
+
+    def read(self, number):
+        with self._lock:
+            self._read = number
+            self._advance()
+
+    def start(self, number):
+        with self._lock:
+            self._pending.add(number)
+
+    def complete(self, number):
+        with self._lock:
+            self._pending.discard(number)
+            self.done.add(number)
+            self._advance()
+
+    def _advance(self):
+        line = min(self._pending) - 1 if self._pending else self._read
+        if line > self.line:
+            self.line = line
+            self.done = {n for n in self.done if n > line}
+
+    def save(self, force=False):
+        if not self.filename:
+            return
+        now = time.monotonic()
+        if not force and now - self._saved_at < self.INTERVAL:
+            return
+        with self._lock:
+            data = {
+                "source": self.source,
+                "line": self.line,
+                "done": sorted(self.done),
+            }
+        write_json(self.filename, data)
+        self._saved_at = now
+
+
+class Importer:
+
+    def __init__(self, parser, checkpoint, api=None, concurrency=4):
+        self.parser = parser
+        self.checkpoint = checkpoint
+        # tasks are only parsed without an api
+        self.api = api
+        self.concurrency = concurrency
+
+        self.lines = 0
+        self.tasks = 0
+        self.resumed = 0
+        self.created = 0
+        self.rejected = 0
+        # the reason the import stopped early
+        self.error = None
+
+        self._stopped = threading.Event()
+        # bounds the number of parsed tasks waiting to be sent
+        self._slots = threading.Semaphore(concurrency * 2)
+        self._lock = threading.Lock()
+
+    def _send(self, number, task):
+        try:
+            response = self.api.create_task(
+                task.title,
+                task.project_id,
+                task.tags,
+                PRIORITY_VALUES.get(task.priority, 0),
+                task.date,
+                task.time,
+                task.timezone,
+            )
+            if response.ok:
+                with self._lock:
+                    self.created += 1
+            elif is_transient(response.status_code):
+                # the remaining tasks would fail as well, the line is sent
+                # again once the import is resumed
+                self.stop(f"line {number}: HTTP {response.status_code}")
+                return
+            else:
+                logger.warning(f"Line {number} rejected: HTTP {response.status_code}")
+                with self._lock:
+                    self.rejected += 1
+        except Exception as err:
+            self.stop(f"line {number}: {err}")
+            return
+        finally:
+            self._slots.release()
+
+        self.checkpoint.complete(number)
+
+    def stop(self, reason):
+        with self._lock:
+            if self.error is None:
+                self.error = reason
+        self._stopped.set()
+
+    def run(self, queries):
+        executor = ThreadPoolExecutor(self.concurrency) if self.api else None
+        try:
+            for number, query in queries:
+                if self._stopped.is_set():
+                    break
+                self.lines += 1
+
+                if self.checkpoint.skip(number):
+                    self.resumed += 1
+                    continue
+
+                task = self.parser.parse(query) if query else None
+                if task is not None and task.title.strip():
+                    self.tasks += 1
+                    if executor:
+                        self._slots.acquire()
+                        self.checkpoint.start(number)
+                        executor.submit(self._send, number, task)
+
+                self.checkpoint.read(number)
+                self.checkpoint.save()
+        except KeyboardInterrupt:
+            self.stop("interrupted")
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+            self.checkpoint.save(force=True)
+
+
+def checkpoint_path(filename):
+    digest = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()
+    return get_path(f"import-{digest[:12]}.json")
+
+
+def load_projects(api):
+    projects = ProjectCache(None).load()
+    if projects or api is None:
+        return projects
+
+    response = api.get_projects()
+    if not response.ok:
+        logger.warning(f"Cannot fetch projects: {response.status_code}")
+        return []
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import tasks from a file, one per line in the quick-add syntax"
+    )
+    parser.add_argument(
+        "file", help='a text, todo.txt, Markdown or CSV file, "-" for stdin'
+    )
+    parser.add_argument("--format", choices=FORMATS, help="detected by the file name")
+    parser.add_argument("--dry-run", action="store_true", help="only parse the tasks")
+    parser.add_argument("--concurrency", type=int, default=SubmissionWorker.MAX_WORKERS)
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the progress of earlier runs"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(levelname)s %(message)s",
+    )
+
+    api = None
+    if not args.dry_run:
+        tokens = TokenManager()
+        tokens.load()
+        if not tokens.usable():
+            sys.exit(f"{tokens.problem()}, retrieve one in the extension first")
+        api = TickTickApi(tokens.access_token)
+        api.on_response = tokens.observe
+
+    string_parser = StringParser()
+    string_parser.init_projects(load_projects(api))
+
+    # stdin and dry runs cannot be resumed
+    stdin = args.file == "-"
+    filename = None if stdin or args.dry_run else checkpoint_path(args.file)
+    checkpoint = Checkpoint(filename, "-" if stdin else os.path.abspath(args.file))
+    if not args.restart and checkpoint.load():
+        logger.info(f"Resuming after line {checkpoint.line}")
+
+    concurrency = max(min(args.concurrency, TickTickApi.POOL_SIZE), 1)
+    importer = Importer(string_parser, checkpoint, api, concurrency)
+    format = args.format or ("text" if stdin else detect_format(args.file))
+
+    start = time.monotonic()
+    if stdin:
+        importer.run(read_queries(sys.stdin, format))
+    else:
+        with open(args.file, "r", newline="" if format == "csv" else None) as f:
+            importer.run(read_queries(f, format))
+    duration = time.monotonic() - start
+    if api:
+        api.close()
+
+    summary = f"{importer.lines} lines, {importer.tasks} tasks"
+    if importer.resumed:
+        summary += f", {importer.resumed} lines done before"
+    if not args.dry_run:
+        summary += f", {importer.created} created, {importer.rejected} rejected"
+    summary += (
+        f" in {duration:.2f}s ({importer.lines / max(duration, 1e-9):.0f} lines/s)"
+    )
+    print(summary)
+
+    if importer.error:
+        sys.exit(f"Import stopped at {importer.error}, run it again to resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from fuzzy import FuzzyMatcher
+
+_TERMINAL = ""
+
+
+class ProjectIndex:
+
+    def __init__(self, project_array=()):
+        self._root = dict()
+        self._projects = dict()
+        # project id -> name
+        self._names = dict()
+        self._bonus = (None, None)
+
+        for project in project_array:
+            name = project["name"]
+            if not name:
+                continue
+            self._projects[name.casefold()] = (project["id"], name)
+            self._names[project["id"]] = name
+
+        for key, value in self._projects.items():
+            node = self._root
+            for c in key:
+                node = node.setdefault(c, dict())
+            node[_TERMINAL] = value
+
+        self._matcher = FuzzyMatcher(
+            (key, name) for key, (_, name) in self._projects.items()
+        )
+
+    def __len__(self):
+        return len(self._projects)
+
+    def longest_match(self, string, pos=0):
+        # returns the end offset and (id, name) of the longest project name
+        # starting at pos which is followed by a blank or the end of string
+        node = self._root
+        result = None
+        length = len(string)
+        i = pos
+        while i < length:
+            for c in string[i].casefold():
+                node = node.get(c)
+                if node is None:
+                    return result
+            i += 1
+            if _TERMINAL in node and (i == length or string[i].isspace()):
+                result = (i, node[_TERMINAL])
+        return result
+
+    def search(self, query, max_matches=0, bonus=None):
+        # returns the names of the projects matching query fuzzily, best
+        # match first, bonus maps project ids to a raise of their score
+        if bonus:
+            # the same bonuses are passed for a while, they are only mapped
+            # to names once
+            if self._bonus[0] is not bonus:
+                self._bonus = (
+                    bonus,
+                    {
+                        self._names[project_id]: value
+                        for project_id, value in bonus.items()
+                        if project_id in self._names
+                    },
+                )
+            bonus = self._bonus[1]
+        return self._matcher.search(query, max_matches, bonus)
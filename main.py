@@ -1,10 +1,13 @@
-import os
+import time
 import logging
 
 from ulauncher.api.client.Extension import Extension
 from ulauncher.api.client.EventListener import EventListener
 from ulauncher.api.shared.event import KeywordQueryEvent
 from ulauncher.api.shared.event import ItemEnterEvent
+from ulauncher.api.shared.event import PreferencesEvent
+from ulauncher.api.shared.event import PreferencesUpdateEvent
+from ulauncher.api.shared.event import SystemExitEvent
 from ulauncher.api.shared.item.ExtensionResultItem import ExtensionResultItem
 from ulauncher.api.shared.item.ExtensionSmallResultItem import ExtensionSmallResultItem
 from ulauncher.api.shared.action.SetUserQueryAction import SetUserQueryAction
@@ -12,61 +15,99 @@ from ulauncher.api.shared.action.RenderResultListAction import RenderResultListA
 from ulauncher.api.shared.action.DoNothingAction import DoNothingAction
 from ulauncher.api.shared.action.HideWindowAction import HideWindowAction
 from ulauncher.api.shared.action.ExtensionCustomAction import ExtensionCustomAction
-
-from auth import AuthManager
+from ulauncher.api.shared.action.OpenUrlAction import OpenUrlAction
+from ulauncher.api.shared.Response import Response
+
+from outbox import Outbox
+from cache import ProjectCache
+from credentials import TokenManager
+from dispatch import LatestDispatcher
+from lru import LRUCache
 from ticktick import TickTickApi
-from parser import StringParser
+from parser import StringParser, ParsedTask, PRIORITY_VALUES
+from search import TaskIndex
+from stats import stats
+from storage import get_path
+from tags import TagIndex
+from usage import UsageStats
 from variable import Variable, VariableUpdateListener
+from worker import SubmissionWorker
 
 logger = logging.getLogger(__name__)
 
 
 class TickTickExtension(Extension, VariableUpdateListener):
 
-    ACCESS_TOKEN_FILENAME = (
-        "~/.config/ulauncher/ext_preferences/ulauncher-ticktick/access_token"
-    )
+    access_token = None
 
-    access_token = Variable()
+    # the running or last OAuth flow
+    auth = None
 
     def __init__(self):
         super(TickTickExtension, self).__init__()
 
-        itemEnterEventListener = ItemEnterEventListener()
-        keywordQueryEventListener = KeywordQueryEventListener()
+        # listeners are notified on a worker thread, so neither the project
+        # refresh nor the token file write block the caller
+        self.access_token = Variable(name="access_token")
+
+        # every response of the API tells whether the token is still valid
+        self.tokens = TokenManager()
+
+        # a single client shares its connection pool between all listeners
+        self.api = TickTickApi()
+        self.api.on_response = self.tokens.observe
+        self.tags = TagIndex()
+        self.tags.load()
+        self.usage = UsageStats()
+        self.usage.load()
+        self.worker = SubmissionWorker(
+            self.api, Outbox(), ready=self.tokens.usable, on_created=self.on_created
+        )
+
+        itemEnterEventListener = ItemEnterEventListener(self.api)
+        keywordQueryEventListener = KeywordQueryEventListener(
+            self.api, self.tags, self.usage
+        )
+        self.keywordQueryEventListener = keywordQueryEventListener
 
-        self.access_token.subscribe(itemEnterEventListener)
         self.access_token.subscribe(keywordQueryEventListener)
 
-        self.access_token.set(self._read_access_token())
+        self.access_token.set(self.tokens.load())
 
         self.access_token.subscribe(self)
 
         self.subscribe(KeywordQueryEvent, keywordQueryEventListener)
         self.subscribe(ItemEnterEvent, itemEnterEventListener)
-
-    def _get_access_token_filename(self):
-        return os.path.expanduser(self.ACCESS_TOKEN_FILENAME)
-
-    def _read_access_token(self):
-        filename = self._get_access_token_filename()
-        access_token = ""
-        if os.path.isfile(filename):
-            logger.debug(f'Read access token from "{filename}"')
-            f = open(filename, "r")
-            access_token = f.read()
-        return access_token
-
-    def _write_access_token(self, access_token):
-        filename = self._get_access_token_filename()
-        logger.debug(f'Write access token to "{filename}"')
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        f = open(filename, "w")
-        f.write(access_token)
-        f.close()
+        self.subscribe(PreferencesEvent, PreferencesEventListener())
+        self.subscribe(PreferencesUpdateEvent, PreferencesUpdateEventListener())
+        self.subscribe(SystemExitEvent, SystemExitEventListener())
+
+    def apply_preference(self, key, value):
+        if key == "refresh_interval":
+            self.keywordQueryEventListener.cache.set_refresh_interval(value)
+            self.keywordQueryEventListener.tasks.set_refresh_interval(value)
+        elif key == "warm_up_window":
+            self.api.set_warm_up_window(value)
+        elif key == "instrumentation":
+            stats.enabled = value == "on"
+
+    def on_created(self, data):
+        # only tasks that were actually created count for the suggestions
+        self.tags.record(data["tags"])
+        self.usage.record("projects", data["project_id"])
+        for name, value in PRIORITY_VALUES.items():
+            if value == data["priority"]:
+                self.usage.record("priorities", name)
+
+    def send_response(self, event, action):
+        # results rendered off the event loop are sent through the private
+        # client of Ulauncher v5, which has no public API for it
+        self._client.send(Response(event, action))
 
     def on_update(self, value):
-        self._write_access_token(value)
+        self.tokens.set(value)
+        # tasks held back for want of a valid token are sent now
+        self.worker.resume()
 
     def get_access_token(self):
         return self.access_token.get()
@@ -77,13 +118,38 @@ class TickTickExtension(Extension, VariableUpdateListener):
 
 class KeywordQueryEventListener(EventListener, VariableUpdateListener):
 
+    RESULTS_CACHE_SIZE = 256
+
+    SEARCH_RESULTS = 10
+
+    TASK_URL = "https://ticktick.com/webapp/#p/{project_id}/tasks/{task_id}"
+
     api = None
     parser = None
+    cache = None
+    results = None
+    tasks = None
+    tags = None
 
-    def __init__(self):
+    def __init__(self, api, tags, usage):
         super().__init__()
-        self.api = TickTickApi()
+        self.api = api
+        self.tags = tags
+        self.usage = usage
         self.parser = StringParser()
+        self.parser.init_tags(tags)
+        self.parser.init_usage(usage)
+        self.cache = ProjectCache(self._on_projects)
+        self.parser.init_projects(self.cache.load())
+        self.results = LRUCache(self.RESULTS_CACHE_SIZE)
+        self.tasks = TaskIndex(self._on_tasks)
+        # queries are rendered on a worker thread, a query arriving while it
+        # is busy supersedes the pending one
+        self.dispatcher = LatestDispatcher(self._render, "query")
+        # None while no revalidation is pending, otherwise whether the cached
+        # projects have to be dropped
+        self.pending_revalidation = None
+        self.started = False
 
     def _compile_description(self, tags, priority, adate, atime, project_name):
         extracts = []
@@ -111,81 +177,150 @@ class KeywordQueryEventListener(EventListener, VariableUpdateListener):
 
         return result
 
+    def _compile_task_description(self, task):
+        return self._compile_description(
+            task.tags, task.priority, task.date, task.time, task.project_name
+        )
+
+    def _task_data(self, task):
+        return {
+            "action": "create",
+            "title": task.title,
+            "tags": task.tags,
+            "priority": PRIORITY_VALUES.get(task.priority, 0),
+            "date": task.date,
+            "time": task.time,
+            "timezone": task.timezone,
+            "project_name": task.project_name,
+            "project_id": task.project_id,
+        }
+
+    def _on_projects(self, project_array):
+        self.parser.init_projects(project_array)
+        # tasks of new projects are indexed right away
+        self.tasks.wakeup()
+
+    def _on_tasks(self):
+        # tags of synced tasks are suggested as well
+        self.tags.seed(self.tasks.tag_counts())
+
     def on_update(self, value):
+        # a different account invalidates the cached projects
+        reset = bool(self.api.access_token)
         self.api.access_token = value
 
+        # the refresh is deferred to the first query, so that startup does
+        # not wait for the network
         if value:
-            response = self.api.get_projects()
+            self.pending_revalidation = self.pending_revalidation or reset
+            if self.started:
+                self._revalidate()
 
-            if response.ok:
-                self.parser.init_projects(response.json())
+    def _revalidate(self):
+        if self.pending_revalidation is not None:
+            self.cache.revalidate(self.api, self.pending_revalidation)
+            self.pending_revalidation = None
 
-    def on_event(self, event: KeywordQueryEvent, extension: TickTickExtension):
-
-        arg_str = event.get_argument() if event.get_argument() else ""
+    def _get_task_items(self, query, arg_str, check=None):
+        # check raises Cancelled once the query is superseded
+        check = check if check else lambda: None
 
         items = []
 
-        if extension.get_access_token():
-
-            # add project name suggestions item
+        # add project name suggestions item
+        with stats.timer("query.project_suggestions"):
             base, suggestions = self.parser.get_project_suggestions(
-                event.get_query(), max_matches=10
+                query, max_matches=10
             )
+        check()
 
-            for suggestion in suggestions:
+        for suggestion in suggestions:
 
-                items.append(
-                    ExtensionSmallResultItem(
-                        icon="images/ticktick.png",
-                        name=f"~{suggestion}",
-                        description="",
-                        on_enter=SetUserQueryAction(f"{base}~{suggestion} "),
-                    )
+            items.append(
+                ExtensionSmallResultItem(
+                    icon="images/ticktick.png",
+                    name=f"~{suggestion}",
+                    description="",
+                    on_enter=SetUserQueryAction(f"{base}~{suggestion} "),
                 )
+            )
+
+        # add tag suggestions item
+        with stats.timer("query.tag_suggestions"):
+            base, suggestions = self.parser.get_tag_suggestions(query, max_matches=10)
+        check()
+
+        for suggestion in suggestions:
+
+            items.append(
+                ExtensionSmallResultItem(
+                    icon="images/ticktick.png",
+                    name=f"#{suggestion}",
+                    description="",
+                    on_enter=SetUserQueryAction(f"{base}#{suggestion} "),
+                )
+            )
 
-            # add priority suggestions item
-            base, suggestions = self.parser.get_priority_suggestions(event.get_query())
+        # add priority suggestions item
+        with stats.timer("query.priority_suggestions"):
+            base, suggestions = self.parser.get_priority_suggestions(query)
+        check()
 
-            for suggestion in suggestions:
+        for suggestion in suggestions:
+
+            items.append(
+                ExtensionSmallResultItem(
+                    icon="images/ticktick.png",
+                    name=f"!{suggestion}",
+                    description="",
+                    on_enter=SetUserQueryAction(f"{base}!{suggestion} "),
+                )
+            )
+
+        if not len(items):
+            with stats.timer("query.parse"):
+                tasks = [
+                    task for task in self.parser.parse_many(arg_str) if task.title
+                ] or [ParsedTask()]
+            check()
+
+            if len(tasks) > 1:
+                # add item "Create new tasks" followed by a preview of
+                # each task, all of them submit the whole batch
+                data = {
+                    "action": "create_many",
+                    "tasks": [self._task_data(task) for task in tasks],
+                }
+                action = ExtensionCustomAction(data)
 
                 items.append(
-                    ExtensionSmallResultItem(
+                    ExtensionResultItem(
                         icon="images/ticktick.png",
-                        name=f"!{suggestion}",
-                        description="",
-                        on_enter=SetUserQueryAction(f"{base}!{suggestion} "),
+                        name=f"Create {len(tasks)} new tasks",
+                        description="Press Enter to create all of them.",
+                        on_enter=action,
                     )
                 )
 
-            if not len(items):
+                for task in tasks:
+                    items.append(
+                        ExtensionSmallResultItem(
+                            icon="images/ticktick.png",
+                            name=task.title,
+                            description=self._compile_task_description(task),
+                            on_enter=action,
+                        )
+                    )
+
+            else:
                 # add item "Create new task"
-                title, tags = self.parser.extract_hashtags(arg_str)
-                title, priority = self.parser.extract_priority(title)
-                title, adate, atime, atimezone = self.parser.extract_time(title)
-                title, project_name, project_id = self.parser.extract_project(title)
+                task = tasks[0]
 
                 desc = ""
                 action = None
-                if len(title) > 0:
-                    desc = self._compile_description(
-                        tags, priority, adate, atime, project_name
-                    )
-                    priority_dict = {"low": 1, "medium": 3, "high": 5}
-
-                    data = {
-                        "action": "create",
-                        "title": title,
-                        "tags": tags,
-                        "priority": priority_dict.get(priority, 0),
-                        "date": adate,
-                        "time": atime,
-                        "timezone": atimezone,
-                        "project_name": project_name,
-                        "project_id": project_id,
-                    }
-
-                    action = ExtensionCustomAction(data)
+                if len(task.title) > 0:
+                    desc = self._compile_task_description(task)
+                    action = ExtensionCustomAction(self._task_data(task))
                 else:
                     desc = "Type in a task title and press Enter..."
                     action = DoNothingAction()
@@ -199,19 +334,259 @@ class KeywordQueryEventListener(EventListener, VariableUpdateListener):
                     )
                 )
 
+                # add relative date suggestions item, previewing the date
+                with stats.timer("query.date_suggestions"):
+                    base, suggestions = self.parser.get_date_suggestions(
+                        query, max_matches=3
+                    )
+
+                for suggestion, adate in suggestions:
+
+                    items.append(
+                        ExtensionSmallResultItem(
+                            icon="images/ticktick.png",
+                            name=suggestion,
+                            description=adate.strftime("%a, %x"),
+                            on_enter=SetUserQueryAction(f"{base}{suggestion} "),
+                        )
+                    )
+
+        return items
+
+    def _get_search_items(self, query):
+        if not self.tasks.available:
+            return [
+                ExtensionResultItem(
+                    icon="images/ticktick.png",
+                    name="Search is not available",
+                    description="SQLite lacks the FTS5 extension.",
+                    on_enter=HideWindowAction(),
+                )
+            ]
+
+        if not query.strip():
+            return [
+                ExtensionResultItem(
+                    icon="images/ticktick.png",
+                    name="Search tasks",
+                    description="Type in a search term...",
+                    on_enter=DoNothingAction(),
+                )
+            ]
+
+        with stats.timer("query.search"):
+            matches = self.tasks.search(query, max_matches=self.SEARCH_RESULTS)
+
+        items = []
+        for match in matches:
+            desc = f"~{match['project_name']}" if match["project_name"] else ""
+            if match["due_date"]:
+                desc += f" due {match['due_date'][:10]}"
+            url = self.TASK_URL.format(
+                project_id=match["project_id"], task_id=match["id"]
+            )
+            items.append(
+                ExtensionResultItem(
+                    icon="images/ticktick.png",
+                    name=match["title"],
+                    description=desc.strip(),
+                    on_enter=OpenUrlAction(url),
+                )
+            )
+
+        if not items:
+            items.append(
+                ExtensionResultItem(
+                    icon="images/ticktick.png",
+                    name="No matching tasks",
+                    description=f'No indexed task matches "{query.strip()}".',
+                    on_enter=DoNothingAction(),
+                )
+            )
+
+        return items
+
+    def _get_stats_items(self):
+        items = [
+            ExtensionResultItem(
+                icon="images/ticktick.png",
+                name="Latency statistics",
+                description=(
+                    "Press Enter to dump them to stats.json and stats.prom."
+                    if stats.enabled
+                    else "Instrumentation is disabled in the preferences."
+                ),
+                on_enter=ExtensionCustomAction({"action": "dump_stats"}),
+            )
+        ]
+
+        for name, summary in stats.snapshot().items():
+            if "p50" not in summary:
+                continue
+            items.append(
+                ExtensionSmallResultItem(
+                    icon="images/ticktick.png",
+                    name=name,
+                    description=(
+                        f"n={summary['count']} "
+                        f"p50={summary['p50'] * 1000:.2f}ms "
+                        f"p95={summary['p95'] * 1000:.2f}ms "
+                        f"p99={summary['p99'] * 1000:.2f}ms"
+                    ),
+                    on_enter=DoNothingAction(),
+                )
+            )
+
+        info = self.results.info()
+        items.append(
+            ExtensionSmallResultItem(
+                icon="images/ticktick.png",
+                name="query cache",
+                description=(
+                    f"hits={info['hits']} misses={info['misses']} "
+                    f"size={info['size']}/{info['maxsize']}"
+                ),
+                on_enter=DoNothingAction(),
+            )
+        )
+
+        items.append(
+            ExtensionSmallResultItem(
+                icon="images/ticktick.png",
+                name="rate limiter",
+                description=str(self.api.limiter),
+                on_enter=DoNothingAction(),
+            )
+        )
+
+        if self.tasks.report:
+            items.append(
+                ExtensionSmallResultItem(
+                    icon="images/ticktick.png",
+                    name="task sync",
+                    description=str(self.tasks.report),
+                    on_enter=DoNothingAction(),
+                )
+            )
+
+        return items
+
+    def on_event(self, event: KeywordQueryEvent, extension: TickTickExtension):
+        if not self.started:
+            self.started = True
+            self._revalidate()
+            extension.worker.start()
+            self.tasks.start(self.api, lambda: self.parser.project_array)
+        else:
+            # the first query refreshes the projects, which validates the
+            # token as well
+            extension.tokens.validate(self.api)
+
+        # a task is likely created soon, the connection is opened meanwhile
+        if extension.tokens.usable():
+            self.api.warm_up()
+
+        # the result list is sent once it is rendered, nothing is returned
+        # here, so that newer queries are received in the meantime
+        self.dispatcher.submit((event, extension))
+
+    @stats.timed("query")
+    def _render(self, item, generation):
+        event, extension = item
+        action = self._get_action(event, extension, generation)
+        # only the newest query is rendered
+        self.dispatcher.check(generation)
+        extension.send_response(event, action)
+
+    def _get_action(self, event, extension, generation):
+
+        query = event.get_query()
+        arg_str = event.get_argument() if event.get_argument() else ""
+
+        # hidden query showing the recorded statistics
+        if arg_str.strip() == ":stats":
+            return RenderResultListAction(self._get_stats_items())
+
+        items = []
+
+        if extension.tokens.usable() and arg_str.startswith("?"):
+
+            # search mode, the index changes in the background, so its
+            # results are not cached
+            items.extend(self._get_search_items(arg_str[1:]))
+
+        elif extension.tokens.usable():
+
+            # results only depend on the query, the project and tag indexes,
+            # the usage statistics and the current minute, which decides
+            # whether a time is today or tomorrow
+            key = (
+                query,
+                self.parser.version,
+                self.tags.version,
+                self.usage.version,
+                int(time.time() // 60),
+            )
+            task_items = self.results.get(key)
+            if task_items is None:
+                task_items = self._get_task_items(
+                    query, arg_str, lambda: self.dispatcher.check(generation)
+                )
+                self.results.put(key, task_items)
+            items.extend(task_items)
+
+            # add status items of recent submissions
+            for status in extension.worker.get_statuses():
+                items.append(
+                    ExtensionSmallResultItem(
+                        icon="images/ticktick.png",
+                        name="Task created" if status.ok else "Task not created",
+                        description=status.message,
+                        on_enter=DoNothingAction(),
+                    )
+                )
+
         else:
 
             client_id = extension.preferences["client_id"]
             client_secret = extension.preferences["client_secret"]
 
-            if client_id and client_secret:
+            auth = extension.auth
+
+            if auth and auth.running():
+                # add item "Waiting for authorization"
+                if auth.status == auth.EXCHANGING:
+                    desc = "Retrieving the access token..."
+                else:
+                    minutes, seconds = divmod(int(auth.remaining()), 60)
+                    desc = (
+                        f"Continue in your browser, {minutes}:{seconds:02d} left. "
+                        "Press Enter to cancel."
+                    )
+                items.append(
+                    ExtensionResultItem(
+                        icon="images/ticktick.png",
+                        name="Waiting for authorization",
+                        description=desc,
+                        on_enter=ExtensionCustomAction({"action": "cancel_authorize"}),
+                    )
+                )
+
+            elif client_id and client_secret:
                 # add item "Retrieve access token"
                 data = {"action": "authorize"}
+                desc = "Click here to retrieve your access token."
+                if auth and auth.error:
+                    desc = f"{auth.error}. Click here to try again."
+                elif extension.get_access_token():
+                    # expired or rejected
+                    problem = extension.tokens.problem()
+                    desc = f"{problem}, click here to retrieve a new one."
                 items.append(
                     ExtensionResultItem(
                         icon="images/ticktick.png",
                         name="Retrieve access token",
-                        description="Click here to retrieve your access token.",
+                        description=desc,
                         on_enter=ExtensionCustomAction(data),
                     )
                 )
@@ -229,42 +604,93 @@ class KeywordQueryEventListener(EventListener, VariableUpdateListener):
         return RenderResultListAction(items)
 
 
-class ItemEnterEventListener(EventListener, VariableUpdateListener):
+class ItemEnterEventListener(EventListener):
 
-    api = TickTickApi()
+    api = None
 
-    def __init__(self):
+    def __init__(self, api):
         super().__init__()
+        self.api = api
 
-    def _do_create(self, event: ItemEnterEvent, _: TickTickExtension):
-        data = event.get_data()
-        self.api.create_task(
-            data["title"],
-            data["project_id"],
-            data["tags"],
-            data["priority"],
-            data["date"],
-            data["time"],
-            data["timezone"],
-        )
+    def _do_create(self, event: ItemEnterEvent, extension: TickTickExtension):
+        # the task is sent in the background, so the window hides right away
+        extension.worker.submit(event.get_data())
+
+    def _do_create_many(self, event: ItemEnterEvent, extension: TickTickExtension):
+        tasks = event.get_data()["tasks"]
+        extension.worker.submit_many(tasks)
 
     def _do_authorize(self, _: ItemEnterEvent, extension: TickTickExtension):
-        access_token = AuthManager.run(
+        # the OAuth flow is rarely needed, so its dependencies are only
+        # loaded here
+        from auth import AuthManager
+
+        if extension.auth and extension.auth.running():
+            return
+
+        def on_done(auth):
+            if auth.token:
+                # keeps the expiry metadata along with the token
+                extension.tokens.update(auth.token)
+                extension.set_access_token(auth.token["access_token"])
+
+        # the flow waits for the browser on its own thread, queries are
+        # answered in the meantime
+        extension.auth = AuthManager(
+            self.api,
             extension.preferences["client_id"],
             extension.preferences["client_secret"],
             extension.preferences["port"],
+            on_done,
         )
-        extension.set_access_token(access_token)
+        extension.auth.start()
 
-    def on_update(self, value):
-        self.api.access_token = value
+    def _do_cancel_authorize(self, _: ItemEnterEvent, extension: TickTickExtension):
+        if extension.auth:
+            extension.auth.cancel()
 
+    def _do_dump_stats(self, _: ItemEnterEvent, __: TickTickExtension):
+        stats.dump(get_path("stats.json"))
+        stats.dump(get_path("stats.prom"))
+
+    @stats.timed("enter")
     def on_event(self, event: ItemEnterEvent, extension: TickTickExtension):
         action = event.get_data().get("action")
         logger.info(f'Requested action "{action}"')
-        switch = {"create": self._do_create, "authorize": self._do_authorize}
+        switch = {
+            "create": self._do_create,
+            "create_many": self._do_create_many,
+            "authorize": self._do_authorize,
+            "cancel_authorize": self._do_cancel_authorize,
+            "dump_stats": self._do_dump_stats,
+        }
         switch.get(action)(event, extension)
 
 
+class PreferencesEventListener(EventListener):
+
+    def on_event(self, event: PreferencesEvent, extension: TickTickExtension):
+        for key, value in event.preferences.items():
+            extension.apply_preference(key, value)
+
+
+class PreferencesUpdateEventListener(EventListener):
+
+    def on_event(self, event: PreferencesUpdateEvent, extension: TickTickExtension):
+        extension.apply_preference(event.id, event.new_value)
+
+
+class SystemExitEventListener(EventListener):
+
+    SHUTDOWN_TIMEOUT = 5
+
+    def on_event(self, _: SystemExitEvent, extension: TickTickExtension):
+        # a new access token is written before exiting
+        extension.access_token.flush(self.SHUTDOWN_TIMEOUT)
+        extension.worker.shutdown(self.SHUTDOWN_TIMEOUT)
+        extension.usage.flush()
+        extension.tags.flush()
+
+
 if __name__ == "__main__":
     TickTickExtension().run()
@@ -0,0 +1,191 @@
+import os
+import json
+import uuid
+import datetime
+import logging
+import threading
+
+from collections import OrderedDict
+
+from storage import get_path, write_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(data):
+    data = dict(data)
+    if data.get("date"):
+        data["date"] = data["date"].isoformat()
+    if data.get("time"):
+        data["time"] = data["time"].isoformat()
+    return data
+
+
+def _decode(data):
+    if data.get("date"):
+        data["date"] = datetime.date.fromisoformat(data["date"])
+    if data.get("time"):
+        data["time"] = datetime.time.fromisoformat(data["time"])
+    return data
+
+
+class Outbox:
+
+    FILENAME = "outbox.jsonl"
+
+    # number of acknowledged entries after which the journal is rewritten
+    COMPACT_THRESHOLD = 50
+
+    def __init__(self, filename=None):
+        self.filename = filename if filename else get_path(self.FILENAME)
+
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()
+        self._claimed = set()
+        # batch -> [created, failed] of its acknowledged entries
+        self._batches = dict()
+        self._acknowledged = 0
+        self._dirty = False
+
+        self._load()
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        self._file = open(self.filename, "a")
+
+    def _load(self):
+        if not os.path.isfile(self.filename):
+            return
+
+        # end of the last complete line
+        end = 0
+        with open(self.filename, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    line = line.decode("utf-8", "replace").strip()
+                    logger.warning(f'Skip corrupt outbox record "{line}"')
+                    continue
+                if record["op"] == "add":
+                    self._pending[record["id"]] = _decode(record["data"])
+                elif record["op"] == "batch":
+                    self._batches[record["id"]] = record["counts"]
+                else:
+                    data = self._pending.pop(record["id"], None)
+                    if data is not None:
+                        self._count(data, record["op"])
+                    self._acknowledged += 1
+
+        # a torn last line from an interrupted write is cut off, the next
+        # record would be appended to it otherwise
+        if end < os.path.getsize(self.filename):
+            logger.warning("Truncate the torn last outbox record")
+            os.truncate(self.filename, end)
+
+        logger.debug(f"Loaded {len(self._pending)} pending tasks from the outbox")
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._dirty = True
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending)
+
+    def append(self, data):
+        with self._condition:
+            entry_id = uuid.uuid4().hex
+            self._write({"op": "add", "id": entry_id, "data": _encode(data)})
+            self._pending[entry_id] = data
+            self._condition.notify()
+            return entry_id
+
+    def sync(self):
+        # appends are only flushed, a single fsync before sending covers all
+        # entries written since the last one
+        with self._condition:
+            if self._dirty:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+
+    def claim(self, timeout=None):
+        # returns the oldest pending entry not claimed by another sender, or
+        # None if there is none within timeout or wakeup() was called
+        with self._condition:
+            entry = self._next_unclaimed()
+            if entry is None:
+                self._condition.wait(timeout)
+                entry = self._next_unclaimed()
+            if entry is not None:
+                self._claimed.add(entry[0])
+            return entry
+
+    def _next_unclaimed(self):
+        for entry_id, data in self._pending.items():
+            if entry_id not in self._claimed:
+                return entry_id, data
+        return None
+
+    def release(self, entry_id):
+        with self._condition:
+            self._claimed.discard(entry_id)
+            self._condition.notify()
+
+    def ack(self, entry_id, op="done"):
+        # returns [created, failed] of the batch of the entry once its last
+        # entry is acknowledged, also if the others were before a restart
+        with self._condition:
+            self._claimed.discard(entry_id)
+            data = self._pending.pop(entry_id, None)
+            if data is None:
+                return None
+            self._write({"op": op, "id": entry_id})
+            self._acknowledged += 1
+            counts = self._count(data, op)
+            if self._acknowledged >= self.COMPACT_THRESHOLD:
+                self._compact()
+            return counts
+
+    def drop(self, entry_id):
+        return self.ack(entry_id, op="drop")
+
+    def _count(self, data, op):
+        batch = data.get("batch")
+        if not batch:
+            return None
+        counts = self._batches.setdefault(batch, [0, 0])
+        counts[0 if op == "done" else 1] += 1
+        if sum(counts) < data["batch_size"]:
+            return None
+        return self._batches.pop(batch)
+
+    def _compact(self):
+        # rewrite the journal with the pending entries and the counts of
+        # their batches only
+        lines = [
+            json.dumps({"op": "batch", "id": batch, "counts": counts}) + "\n"
+            for batch, counts in self._batches.items()
+        ]
+        lines += [
+            json.dumps({"op": "add", "id": entry_id, "data": _encode(data)}) + "\n"
+            for entry_id, data in self._pending.items()
+        ]
+        self._file.close()
+        write_atomic(self.filename, "".join(lines))
+        self._file = open(self.filename, "a")
+        self._acknowledged = 0
+        self._dirty = False
+        logger.debug(f"Compacted outbox to {len(lines)} entries")
+
+    def wakeup(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            if self._dirty:
+                os.fsync(self._file.fileno())
+            self._file.close()
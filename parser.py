@@ -1,300 +1,510 @@
+import bisect
 import datetime
 import re
 import logging
 
+from clock import Clock, IN_UNITS, WEEKDAYS
+from index import ProjectIndex
+
 logger = logging.getLogger(__name__)
 
+HASHTAG = 1
+PRIORITY = 2
+DATE = 4
+TIME = 8
+PROJECT = 16
+ALL = HASHTAG | PRIORITY | DATE | TIME | PROJECT
+
+PRIORITIES = {
+    "low": "low",
+    "l": "low",
+    "medium": "medium",
+    "m": "medium",
+    "high": "high",
+    "h": "high",
+}
+
+# values of the priorities in the API
+PRIORITY_VALUES = {"low": 1, "medium": 3, "high": 5}
+
+MONTHS = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+    "january": 1,
+    "february": 2,
+    "march": 3,
+    "april": 4,
+    "june": 6,
+    "july": 7,
+    "august": 8,
+    "september": 9,
+    "october": 10,
+    "november": 11,
+    "december": 12,
+}
+
+NEXT_UNITS = {
+    "wk": 1,
+    "mon": 2,
+    "yr": 3,
+    "week": 1,
+    "month": 2,
+    "year": 3,
+}
+
+# date categories in the order in which they take precedence, the last
+# matching category determines the due date
+DATE_CATEGORIES = (
+    "eu",
+    "us",
+    "iso",
+    "month",
+    "next",
+    "in",
+    "weekday",
+    "today",
+    "tomorrow",
+)
+
+_TOKEN_RE = re.compile(r"\S+")
+
+_SINGLE_RE = re.compile(
+    r"(?P<hashtag>#(?P<hashtag_name>[\w\-_]+))"
+    r"|(?P<priority>!(?P<priority_name>(?i:low|medium|high|l|m|h)))"
+    r"|(?P<eu>(?P<eu_d>[0-2][0-9]|3[0-1])\.(?P<eu_m>0[0-9]|1[0-2])\.(?P<eu_y>(?:20)?[0-9]{2})?)"
+    r"|(?P<us>(?P<us_m>0[0-9]|1[0-2])/(?P<us_d>[0-2][0-9]|3[0-1])(?:/(?P<us_y>(?:20)?[0-9]{2}))?)"
+    r"|(?P<iso>(?P<iso_y>20[0-9]{2})-(?P<iso_m>0[0-9]|1[0-2])-(?P<iso_d>[0-2][0-9]|3[0-1]))"
+    r"|(?P<month>(?P<month_name>(?i:" + "|".join(MONTHS.keys()) + r"))\.?)"
+    r"|(?P<next>(?i:next))"
+    r"|(?P<today>(?i:today|tod))"
+    r"|(?P<tomorrow>(?i:tomorrow|tom))"
+    r"|(?P<weekday>(?i:" + "|".join(WEEKDAYS) + r"))"
+    r"|(?P<in>(?i:in))"
+    r"|(?P<time>(?P<time_h>[0-1]?[0-9]|2[0-3]):(?P<time_m>[0-5][0-9]))"
+    r"|(?P<project>~.*)"
+)
+
+_DAY_RE = re.compile(r"([0-2]?[0-9]|3[0-1])(?:th|rd|st|\.)?", re.IGNORECASE)
+
+_YEAR_RE = re.compile(r"(?:20)?[0-9]{2}")
+
+# separates several tasks entered in a single query
+_TASK_DELIMITER_RE = re.compile(r"[;\n]")
+
+# the last three words, a relative date may consist of up to three words
+_DATE_SUGGESTION_RE = re.compile(r"(?<![^\s])(?:\S+ ){0,2}\S+$")
+
+_PROJECT_SUGGESTION_RE = re.compile(r"(?<![^\s])~([^~]*)$")
+
+_TAG_SUGGESTION_RE = re.compile(r"(?<![^\s])#([\w\-]*)$")
+
+_KIND_MASKS = {
+    "hashtag": HASHTAG,
+    "priority": PRIORITY,
+    "eu": DATE,
+    "us": DATE,
+    "iso": DATE,
+    "month": DATE,
+    "next": DATE,
+    "today": DATE,
+    "tomorrow": DATE,
+    "weekday": DATE,
+    "in": DATE,
+    "time": TIME,
+    "project": PROJECT,
+}
+
+
+class ParsedTask:
+
+    __slots__ = (
+        "title",
+        "tags",
+        "priority",
+        "date",
+        "time",
+        "timezone",
+        "project_name",
+        "project_id",
+        "spans",
+    )
+
+    def __init__(self, title=""):
+        self.title = title
+        self.tags = []
+        self.priority = ""
+        self.date = None
+        self.time = None
+        self.timezone = None
+        self.project_name = ""
+        self.project_id = ""
+        # (kind, start, end) of every consumed span in the original query
+        self.spans = []
+
+
+def _resolve_date(d, m, y, today):
+    if not y:
+        date = datetime.date(today.year, m, d)
+        if today > date:
+            date = datetime.date(today.year + 1, m, d)
+        return date
+
+    y = int(y)
+    if y < 100:
+        y += 2000
+    return datetime.date(y, m, d)
+
+
+def _strip_spans(string, spans):
+    # removes every span together with one adjacent blank, preferring the
+    # blank in front of it, returns the result and the original positions
+    # of the remaining characters
+    length = len(string)
+    keep = [True] * length
+    for start, end in spans:
+        before = start - 1
+        while before >= 0 and not keep[before]:
+            before -= 1
+        after = end
+        while after < length and not keep[after]:
+            after += 1
+        if before >= 0 and string[before] == " ":
+            keep[before] = False
+        elif after < length and string[after] == " ":
+            keep[after] = False
+        for i in range(start, end):
+            keep[i] = False
+    kept = [i for i in range(length) if keep[i]]
+    return "".join([string[i] for i in kept]), kept
+
 
 class StringParser:
 
-    projects_dict = dict()
+    def __init__(self, clock=None):
+        self.clock = clock if clock else Clock()
+        self.projects = ProjectIndex()
+        self.project_array = []
+        self.tags = None
+        self.usage = None
+        # incremented whenever the project index is replaced
+        self.version = 0
 
-    def _remove_from_str(self, search, str):
-        rep = search.strip()
-        return re.sub(f"( {rep}|{rep} |{rep})", "", str)
+        self._classified = ("", [])
 
     def init_projects(self, project_array):
-        for project in project_array:
-            self.projects_dict[project["name"].lower()] = (
-                project["id"],
-                project["name"],
-            )
-
-    def extract_project(self, str):
-        project_names = []
-        project_name = ""
-        project_id = ""
-        for name in self.projects_dict.keys():
-            project_names.append(name)
-
-        match = re.search(
-            r"(?<![^\s])~(" + "|".join(project_names) + r")(?![^\s])",
-            str,
-            re.IGNORECASE,
-        )
+        # the index is only rebuilt if the project list actually changed
+        if project_array == self.project_array:
+            return
+
+        self.project_array = project_array
+        self.projects = ProjectIndex(project_array)
+        self.version += 1
+
+    def init_usage(self, usage):
+        # frequently used projects and priorities are suggested first
+        self.usage = usage
+
+    def init_tags(self, tags):
+        # tags is a TagIndex, which is updated in place
+        self.tags = tags
+
+    def _resolve_date_match(self, kind, match, tokens, following, context):
+        # returns the resolved date (or None) and the indices of the tokens
+        # consumed in addition to the matched one
+        today = context.today
+        if kind == "eu":
+            d = int(match.group("eu_d"))
+            m = int(match.group("eu_m"))
+            return _resolve_date(d, m, match.group("eu_y"), today), []
+        if kind == "us":
+            d = int(match.group("us_d"))
+            m = int(match.group("us_m"))
+            return _resolve_date(d, m, match.group("us_y"), today), []
+        if kind == "iso":
+            d = int(match.group("iso_d"))
+            m = int(match.group("iso_m"))
+            y = int(match.group("iso_y"))
+            return datetime.date(y, m, d), []
+        if kind == "month":
+            m = MONTHS[match.group("month_name").lower()]
+            d = 1
+            y = None
+            extra = []
+            if following:
+                day = _DAY_RE.fullmatch(tokens[following[0]][2])
+                if day:
+                    extra.append(following[0])
+                    d = int(day.group(1))
+                    if len(following) > 1 and _YEAR_RE.fullmatch(
+                        tokens[following[1]][2]
+                    ):
+                        extra.append(following[1])
+                        y = tokens[following[1]][2]
+            return _resolve_date(d, m, y, today), extra
+        if kind == "next":
+            unit = tokens[following[0]][2].lower()
+            return context.relative[f"next {unit}"], following[:1]
+        if kind == "in":
+            n = int(tokens[following[0]][2])
+            unit = IN_UNITS[tokens[following[1]][2].lower()]
+            return context.relative[f"in {n} {unit}"], following[:2]
+        return context.relative[match.group().lower()], []
+
+    def _is_relative_in(self, tokens, following, context):
+        # "in" is a common word, it only starts a date if followed by a
+        # number and a unit that resolve
+        if len(following) < 2:
+            return False
+        n = tokens[following[0]][2]
+        unit = IN_UNITS.get(tokens[following[1]][2].lower())
+        return n.isdecimal() and f"in {int(n)} {unit}" in context.relative
+
+    def _match_project(self, string, pos):
+        # pos points to the leading "~"
+        match = self.projects.longest_match(string, pos + 1)
         if match:
-            project_key = match.group(1).lower()
-            project_id, project_name = self.projects_dict.get(project_key)
-            str = self._remove_from_str(match.group(0), str)
-        return str, project_name, project_id
-
-    def extract_time(self, str):
-        date = None
-        time = None
-
-        # match European-style dates DD.MM[.YYYY]
-        match = re.search(
-            r"(?<![^\s])([0-2][0-9]|3[0-1])\.(0[0-9]|1[0-2])\.(?:((?:20)?[0-9]{2}))?(?![^\s])",
-            str,
-        )
-        if match:
-            today = datetime.date.today()
-            d = int(match.group(1))
-            m = int(match.group(2))
-            y = match.group(3)
-            try:
-
-                if not y:
-                    y = today.year
-                    date = datetime.date(y, m, d)
-                    if today > date:
-                        date = datetime.date(y + 1, m, d)
-                else:
-                    y = int(y)
-                    if int(y) < 100:
-                        y = int(y) + 2000
-                    date = datetime.date(y, m, d)
-
-                str = self._remove_from_str(match.group(0), str)
-            except ValueError:
-                logger.warning("Cannot parse date.")
-
-        # match American-style dates MM/DD[/YYYY]
-        match = re.search(
-            r"(?<![^\s])(0[0-9]|1[0-2])/([0-2][0-9]|3[0-1])(?:(?:/)((?:20)?[0-9]{2}))?(?![^\s])",
-            str,
-        )
-        if match:
-            today = datetime.date.today()
-            d = int(match.group(2))
-            m = int(match.group(1))
-            y = match.group(3)
-            try:
-                if not y:
-                    y = today.year
-                    date = datetime.date(y, m, d)
-                    if today > date:
-                        date = datetime.date(y + 1, m, d)
-                else:
-                    y = int(y)
-                    if int(y) < 100:
-                        y = int(y) + 2000
-                    date = datetime.date(y, m, d)
-
-                str = self._remove_from_str(match.group(0), str)
-            except ValueError:
-                logger.warning("Cannot parse date.")
-
-        # match ISO-style dates YYYY-MM-DD
-        match = re.search(
-            r"(?<![^\s])(20[0-9]{2})-(0[0-9]|1[0-2])-([0-2][0-9]|3[0-1])(?![^\s])",
-            str,
-        )
-        if match:
-            d = int(match.group(3))
-            m = int(match.group(2))
-            y = int(match.group(1))
-            try:
-                date = datetime.date(y, m, d)
-
-                str = self._remove_from_str(match.group(0), str)
-            except ValueError:
-                logger.warning("Cannot parse date.")
-
-        # match textual month
-        target_names = dict()
-        target_names["jan"] = 1
-        target_names["feb"] = 2
-        target_names["mar"] = 3
-        target_names["apr"] = 4
-        target_names["may"] = 5
-        target_names["jun"] = 6
-        target_names["jul"] = 7
-        target_names["aug"] = 8
-        target_names["sep"] = 9
-        target_names["oct"] = 10
-        target_names["nov"] = 11
-        target_names["dec"] = 12
-        target_names["january"] = 1
-        target_names["february"] = 2
-        target_names["march"] = 3
-        target_names["april"] = 4
-        target_names["may"] = 5
-        target_names["june"] = 6
-        target_names["july"] = 7
-        target_names["august"] = 8
-        target_names["september"] = 9
-        target_names["october"] = 10
-        target_names["november"] = 11
-        target_names["december"] = 12
-
-        month_string = "|".join(target_names.keys())
-        match = re.search(
-            r"(?<![^\s])("
-            + month_string
-            + r")(?:\.)?(?:\s+([0-2]?[0-9]|3[0-1])(?:(?:th|rd|st|\.))?(?:\s+((?:20)?[0-9]{2}))?)?(?![^\s])",
-            str,
-            re.IGNORECASE,
-        )
-        if match:
-            today = datetime.date.today()
-            d = match.group(2)
-            m = target_names[match.group(1).lower()]
-            y = match.group(3)
-            try:
-                if not d:
-                    d = 1
-                else:
-                    d = int(d)
-
-                if not y:
-                    y = today.year
-                    date = datetime.date(y, m, d)
-                    if today > date:
-                        date = datetime.date(y + 1, m, d)
-
-                else:
-                    y = int(y)
-                    if int(y) < 100:
-                        y = int(y) + 2000
-                    date = datetime.date(y, m, d)
-
-                str = self._remove_from_str(match.group(0), str)
-            except ValueError:
-                logger.warning("Cannot parse date.")
-
-        # match textual next week|month|year
-        # match textual month
-        target_names = dict()
-        target_names["wk"] = 1
-        target_names["mon"] = 2
-        target_names["yr"] = 3
-        target_names["week"] = 1
-        target_names["month"] = 2
-        target_names["year"] = 3
-
-        match = re.search(
-            r"(?<![^\s])next\s+(" + "|".join(target_names.keys()) + r")(?![^\s])",
-            str,
-            re.IGNORECASE,
-        )
-        if match:
-            key = target_names.get(match.group(1))
-            if key == 1:
-                date = datetime.date.today()
-                days = 7 - date.weekday()
-                date = date + datetime.timedelta(days=days)
-            elif key == 2:
-                date = datetime.date.today()
-                date = datetime.date(
-                    date.year if date.month < 12 else date.year + 1,
-                    date.month % 12 + 1,
-                    1,
+            end, (project_id, project_name) = match
+            return end, project_id, project_name
+        return None
+
+    def _classify(self, string):
+        # tokenizes and classifies the query in a single walk. Successive
+        # queries mostly differ in the last token only, so the tokens of the
+        # previous query up to the last common blank are reused.
+        previous, classified = self._classified
+
+        if string.startswith(previous):
+            common = len(previous)
+        elif previous.startswith(string):
+            common = len(string)
+        else:
+            common = 0
+
+        # a token is unchanged if the blank following it is common, too
+        reused = 0
+        while reused < len(classified) and classified[reused][1] < common:
+            reused += 1
+        classified = classified[:reused]
+        pos = classified[-1][1] if classified else 0
+
+        for m in _TOKEN_RE.finditer(string, pos):
+            text = m.group()
+            classified.append((m.start(), m.end(), text, _SINGLE_RE.fullmatch(text)))
+
+        self._classified = (string, classified)
+        return classified
+
+    def parse(self, string, kinds=ALL):
+        task = ParsedTask()
+
+        # the stages below only visit the tokens of their own kind
+        tokens = []
+        buckets = {kind: [] for kind in _KIND_MASKS}
+        for start, end, text, match in self._classify(string):
+            if match and kinds & _KIND_MASKS[match.lastgroup]:
+                buckets[match.lastgroup].append((len(tokens), match))
+            tokens.append((start, end, text))
+
+        consumed = [False] * len(tokens)
+
+        context = self.clock.context() if kinds & (DATE | TIME) else None
+
+        def following(index, count):
+            # the next tokens that have not been consumed by an earlier stage
+            result = []
+            for j in range(index + 1, len(tokens)):
+                if not consumed[j]:
+                    result.append(j)
+                    if len(result) == count:
+                        break
+            return result
+
+        def consume(kind, indices):
+            for j in indices:
+                consumed[j] = True
+            start = tokens[indices[0]][0]
+            end = tokens[indices[-1]][1]
+            task.spans.append((kind, start, end))
+
+        def consume_duplicates(kind, indices):
+            # identical occurrences are removed along with the first match
+            text = string[tokens[indices[0]][0] : tokens[indices[-1]][1]]
+            for index, _ in buckets[kind]:
+                if consumed[index]:
+                    continue
+                group = [index]
+                if len(indices) > 1:
+                    group += following(index, len(indices) - 1)
+                if len(group) == len(indices) and (
+                    string[tokens[index][0] : tokens[group[-1]][1]] == text
+                ):
+                    consume(kind, group)
+
+        for index, match in buckets["hashtag"]:
+            task.tags.append(match.group("hashtag_name"))
+            consume("hashtag", [index])
+
+        if buckets["priority"]:
+            index, match = buckets["priority"][0]
+            task.priority = PRIORITIES[match.group("priority_name").lower()]
+            consume("priority", [index])
+            consume_duplicates("priority", [index])
+
+        for kind in DATE_CATEGORIES:
+            for index, match in buckets[kind]:
+                extra = []
+                if kind in ("month", "next", "in"):
+                    extra = following(index, 2)
+                if kind == "next" and not (
+                    extra and tokens[extra[0]][2].lower() in NEXT_UNITS
+                ):
+                    continue
+                if kind == "in" and not self._is_relative_in(tokens, extra, context):
+                    continue
+
+                try:
+                    date, extra = self._resolve_date_match(
+                        kind, match, tokens, extra, context
+                    )
+                except ValueError:
+                    logger.warning("Cannot parse date.")
+                    break
+
+                if date:
+                    task.date = date
+                consume(kind, [index] + extra)
+                consume_duplicates(kind, [index] + extra)
+                break
+
+        if buckets["time"]:
+            index, match = buckets["time"][0]
+            task.time = datetime.time(
+                int(match.group("time_h")), int(match.group("time_m"))
+            )
+            consume("time", [index])
+            consume_duplicates("time", [index])
+
+            if not task.date:
+                today = context.today
+                dt_now = self.clock.now()
+                dt_then = datetime.datetime(
+                    today.year,
+                    today.month,
+                    today.day,
+                    task.time.hour,
+                    task.time.minute,
                 )
-            elif key == 3:
-                date = datetime.date.today()
-                date = datetime.date(date.year + 1, 1, 1)
-
-            str = self._remove_from_str(match.group(0), str)
-
-        # match textual to[day]
-        match = re.search(r"(?<![^\s])(today|tod)(?![^\s])", str, re.IGNORECASE)
-        if match:
-            date = datetime.date.today()
-
-            str = self._remove_from_str(match.group(0), str)
-
-        # match textual to[morrow]
-        match = re.search(r"(?<![^\s])(tomorrow|tom)(?![^\s])", str, re.IGNORECASE)
-        if match:
-            date = datetime.date.today() + datetime.timedelta(days=1)
-            str = self._remove_from_str(match.group(0), str)
-
-        # match time
-        match = re.search(r"(?<![^\s])([0-1]?[0-9]|2[0-3]):([0-5][0-9])(?![^\s])", str)
-        if match:
-            h = int(match.group(1))
-            m = int(match.group(2))
-
-            if not date:
-                date = datetime.date.today()
+                task.date = today
+                if dt_now > dt_then:
+                    task.date = today + datetime.timedelta(days=1)
+
+        if context:
+            task.timezone = context.timezone
+
+        title, kept = _strip_spans(string, [(s, e) for _, s, e in task.spans])
+
+        # project names are matched against what is left of the query, so
+        # they may span tokens consumed by the stages above
+        matched = None
+        for index, _ in buckets["project"]:
+            pos = bisect.bisect_left(kept, tokens[index][0])
+            if pos == len(kept) or kept[pos] != tokens[index][0]:
+                # removed along with an earlier match
+                continue
+            if matched is None:
+                project = self._match_project(title, pos)
+                if not project:
+                    continue
+                end, task.project_id, task.project_name = project
+                matched = title[pos:end]
+            else:
+                # identical occurrences are removed along with the first match
+                end = pos + len(matched)
+                if title[pos:end] != matched or not (
+                    end == len(title) or title[end].isspace()
+                ):
+                    continue
+            task.spans.append(("project", tokens[index][0], kept[end - 1] + 1))
+            title, remaining = _strip_spans(title, [(pos, end)])
+            kept = [kept[i] for i in remaining]
 
-                dt_now = datetime.datetime.now()
-                dt_then = datetime.datetime(date.year, date.month, date.day, h, m)
+        task.title = title
 
-                if dt_now > dt_then:
-                    date = date + datetime.timedelta(days=1)
+        return task
 
-            time = datetime.time(h, m)
-            str = self._remove_from_str(match.group(0), str)
+    def parse_many(self, string, kinds=ALL):
+        segments = _TASK_DELIMITER_RE.split(string)
+        if len(segments) == 1:
+            return [self.parse(string, kinds)]
+        return [
+            self.parse(segment.strip(), kinds)
+            for segment in segments
+            if segment.strip()
+        ]
 
-        tz_string = datetime.datetime.now(datetime.timezone.utc).astimezone().tzname()
+    def extract_project(self, str):
+        task = self.parse(str, PROJECT)
+        return task.title, task.project_name, task.project_id
 
-        return str, date, time, tz_string
+    def extract_time(self, str):
+        task = self.parse(str, DATE | TIME)
+        return task.title, task.date, task.time, task.timezone
 
     def extract_hashtags(self, string):
-        text_list = string.split()
-        tags = []
-        p = r"^#([\w\-_]+)$"
-        for i in text_list:
-            match = re.search(p, i)
-            if match:
-                tags.append(match.group(1))
-                string = self._remove_from_str(match.group(0), string)
-
-        return string, tags
+        task = self.parse(string, HASHTAG)
+        return task.title, task.tags
 
     def extract_priority(self, string):
+        task = self.parse(string, PRIORITY)
+        return task.title, task.priority
 
-        priority_dict = {
-            "low": "low",
-            "l": "low",
-            "medium": "medium",
-            "m": "medium",
-            "high": "high",
-            "h": "high",
-        }
-
-        priority = ""
-        p = r"(?<![^\s])!(low|medium|high|l|m|h)(?![^\s])"
+    def get_project_suggestions(self, arg_str, max_matches=0):
+        match = _PROJECT_SUGGESTION_RE.search(arg_str)
 
-        match = re.search(p, string, re.IGNORECASE)
         if match:
-            priority = priority_dict.get(match.group(1).lower(), "")
-            string = self._remove_from_str(match.group(0), string)
+            search = match.group(1)
+            base = arg_str[0 : len(arg_str) - len(search) - 1]
 
-        return string, priority
+            bonus = self.usage.bonuses("projects") if self.usage else None
+            return base, self.projects.search(search, max_matches, bonus)
 
-    def get_project_suggestions(self, arg_str, max_matches=0):
-        projects = []
-        num_matches = 0
-        arg_len = len(arg_str)
+        return arg_str, []
 
-        match = re.search(r"(?<![^\s])~([\w_\- ]*)$", arg_str, re.IGNORECASE)
+    def get_tag_suggestions(self, arg_str, max_matches=0):
+        match = _TAG_SUGGESTION_RE.search(arg_str)
 
-        if match:
+        if match and self.tags is not None:
             search = match.group(1)
-            base = arg_str[0 : arg_len - len(search) - 1]
-            for project in self.projects_dict.values():
-                if len(search) < len(project[1]) and re.match(
-                    search, project[1], re.IGNORECASE
-                ):
-                    projects.append(project[1])
-                    num_matches += 1
-                    if num_matches == max_matches:
-                        break
+            base = arg_str[0 : len(arg_str) - len(search) - 1]
+            return base, self.tags.suggest(search, max_matches)
+
+        return arg_str, []
 
-            return base, projects
+    def get_date_suggestions(self, arg_str, max_matches=0):
+        # returns the base and (keyword, date) of the relative dates which
+        # complete the end of arg_str, preferring the longest prefix
+        match = _DATE_SUGGESTION_RE.search(arg_str)
+
+        if match:
+            context = self.clock.context()
+            words = match.group().split(" ")
+            for i in range(len(words)):
+                search = " ".join(words[i:])
+                if len(search) < 2:
+                    continue
+                suggestions = context.complete(search, max_matches)
+                if suggestions:
+                    return arg_str[0 : len(arg_str) - len(search)], suggestions
 
         return arg_str, []
 
@@ -308,7 +518,13 @@ class StringParser:
         if match:
             search = match.group(1)
             base = arg_str[0 : arg_len - len(search) - 1]
-            for priority in ["low", "medium", "high"]:
+            # frequently used priorities first, the sort is stable
+            candidates = ["low", "medium", "high"]
+            if self.usage is not None:
+                bonus = self.usage.bonuses("priorities")
+                candidates.sort(key=lambda priority: -bonus.get(priority, 0))
+
+            for priority in candidates:
                 if len(search) < len(priority) and re.match(
                     search, priority, re.IGNORECASE
                 ):
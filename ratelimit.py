@@ -0,0 +1,225 @@
+import time
+import random
+import logging
+import threading
+
+from collections import deque
+
+from stats import stats
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value):
+    # Retry-After is given in seconds or as an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    # email is only imported for the rare HTTP date
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+
+    # requests per second, the rate adapts between MIN_RATE and MAX_RATE.
+    # Without a rate requests are not limited until the server throttles
+    # them, the rate then starts from the one observed within WINDOW seconds.
+    RATE = None
+    MIN_RATE = 0.5
+    MAX_RATE = 50.0
+    WINDOW = 1.0
+
+    # requests that may be sent at once after an idle period
+    BURST = 10
+
+    # the rate grows by INCREASE per second while requests succeed and is
+    # multiplied by DECREASE once they are throttled, or by
+    # SERVER_ERROR_DECREASE once a server error comes with a Retry-After.
+    # Other server errors are retried but say nothing about the load.
+    INCREASE = 2.0
+    DECREASE = 0.7
+    SERVER_ERROR_DECREASE = 0.8
+
+    # within this share of the rate that was last throttled the rate grows
+    # PROBE_SLOWDOWN times slower, so that it settles instead of oscillating
+    PROBE_BAND = 0.1
+    PROBE_SLOWDOWN = 8
+
+    # responses to requests sent before a decrease reflect the former rate
+    # and do not decrease it again within this many seconds
+    DECREASE_INTERVAL = 1.0
+
+    # bounds of the jittered exponential backoff between attempts
+    MIN_BACKOFF = 0.5
+    MAX_BACKOFF = 30.0
+
+    # longest Retry-After that is honoured
+    MAX_RETRY_AFTER = 60.0
+
+    def __init__(self, rate=RATE, burst=BURST, enabled=True):
+        self.rate = rate
+        self.burst = burst
+        # a disabled limiter neither waits nor adapts, e.g. for benchmarks
+        self.enabled = enabled
+
+        self.requests = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.retries = 0
+        self.throttled = 0
+        self.server_errors = 0
+
+        self._tokens = float(burst)
+        # lies in the future while the server asked to wait
+        self._refilled = time.monotonic()
+        self._decreased_at = 0.0
+        self._ceiling = None
+        # send times of the latest requests while there is no rate
+        self._sent = deque(maxlen=int(self.MAX_RATE * self.WINDOW))
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is None:
+            self._refilled = max(self._refilled, now)
+        elif now > self._refilled:
+            self._tokens = min(
+                self._tokens + (now - self._refilled) * self.rate, float(self.burst)
+            )
+            self._refilled = now
+
+    def acquire(self):
+        # blocks until a request may be sent, returns the seconds waited. The
+        # token is taken right away and the bucket may go into debt, so that
+        # callers are served in order.
+        if not self.enabled:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            if self.rate is None:
+                self._sent.append(now)
+                delay = max(self._refilled - now, 0.0)
+            else:
+                self._refill(now)
+                self._tokens -= 1
+                delay = max(self._refilled - now, 0.0)
+                delay += max(-self._tokens, 0.0) / self.rate
+            if delay > 0:
+                self.waits += 1
+                self.waited += delay
+
+        if delay > 0:
+            if stats.enabled:
+                stats.record("api.wait", delay)
+            time.sleep(delay)
+        return delay
+
+    def update(self, status_code, retry_after=None):
+        # adapts the rate to a response, returns the seconds the server asked
+        # to wait before the next request
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            retry_after = min(retry_after, self.MAX_RETRY_AFTER)
+
+        with self._lock:
+            if status_code >= 500:
+                self.server_errors += 1
+            overloaded = status_code == 429 or (
+                status_code >= 500 and retry_after is not None
+            )
+
+            if overloaded:
+                if status_code == 429:
+                    self.throttled += 1
+                    factor = self.DECREASE
+                else:
+                    factor = self.SERVER_ERROR_DECREASE
+
+                if self.rate is None:
+                    self.rate = self._observed_rate(now)
+                    self._tokens = 0.0
+                    self._decreased_at = 0.0
+                    logger.debug(f"Limiting requests to {self.rate:.2f}/s")
+
+                if now - self._decreased_at >= self.DECREASE_INTERVAL:
+                    if status_code == 429:
+                        self._ceiling = self.rate
+                    self._refill(now)
+                    self.rate = max(self.rate * factor, self.MIN_RATE)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._decreased_at = now
+                    logger.debug(f"Decreased the request rate to {self.rate:.2f}/s")
+
+                # every request waits for the server, not only the rejected
+                # one, and the bucket only refills afterwards
+                if retry_after:
+                    self._refill(now)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._refilled = max(self._refilled, now + retry_after)
+            elif status_code < 400 and self.rate is not None:
+                increase = self.INCREASE
+                if (
+                    self._ceiling
+                    and abs(self.rate / self._ceiling - 1) < self.PROBE_BAND
+                ):
+                    increase /= self.PROBE_SLOWDOWN
+                self.rate = min(self.rate + increase / self.rate, self.MAX_RATE)
+
+        return retry_after
+
+    def _observed_rate(self, now):
+        sent = sum(1 for t in self._sent if now - t <= self.WINDOW)
+        return min(max(sent / self.WINDOW, self.MIN_RATE), self.MAX_RATE)
+
+    def backoff(self, attempt, retry_after=None):
+        # full jitter spreads the retries of concurrent requests, a
+        # Retry-After of the server is a lower bound
+        with self._lock:
+            self.retries += 1
+        delay = random.uniform(
+            self.MIN_BACKOFF,
+            min(self.MIN_BACKOFF * 2 ** (attempt + 1), self.MAX_BACKOFF),
+        )
+        return max(delay, retry_after or 0.0)
+
+    def state(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "tokens": self._tokens,
+                "burst": self.burst,
+                "ceiling": self._ceiling,
+                "blocked": max(self._refilled - time.monotonic(), 0.0),
+                "requests": self.requests,
+                "waits": self.waits,
+                "waited": self.waited,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "server_errors": self.server_errors,
+            }
+
+    def __str__(self):
+        state = self.state()
+        if not self.enabled:
+            return "disabled"
+        rate = f"{state['rate']:.1f}/s" if state["rate"] else "unlimited"
+        return (
+            f"rate={rate} tokens={state['tokens']:.1f}"
+            f" waits={state['waits']} waited={state['waited']:.1f}s"
+            f" retries={state['retries']} throttled={state['throttled']}"
+            f" errors={state['server_errors']}"
+        )
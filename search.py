@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from stats import stats
+from storage import get_path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    project_name TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    content TEXT NOT NULL DEFAULT '',
+    tags TEXT NOT NULL DEFAULT '',
+    due_date TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_project_id ON tasks (project_id);
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    title, content, tags, content='tasks', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_ai AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, title, content, tags)
+    VALUES (new.rowid, new.title, new.content, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_ad AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, content, tags)
+    VALUES ('delete', old.rowid, old.title, old.content, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_au AFTER UPDATE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, content, tags)
+    VALUES ('delete', old.rowid, old.title, old.content, old.tags);
+    INSERT INTO tasks_fts (rowid, title, content, tags)
+    VALUES (new.rowid, new.title, new.content, new.tags);
+END;
+"""
+
+UPSERT = """
+INSERT INTO tasks (id, project_id, project_name, title, content, tags, due_date, priority)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    project_id = excluded.project_id,
+    project_name = excluded.project_name,
+    title = excluded.title,
+    content = excluded.content,
+    tags = excluded.tags,
+    due_date = excluded.due_date,
+    priority = excluded.priority
+WHERE tasks.project_id IS NOT excluded.project_id
+    OR tasks.project_name IS NOT excluded.project_name
+    OR tasks.title IS NOT excluded.title
+    OR tasks.content IS NOT excluded.content
+    OR tasks.tags IS NOT excluded.tags
+    OR tasks.due_date IS NOT excluded.due_date
+    OR tasks.priority IS NOT excluded.priority
+"""
+
+# relevance is rounded, so that equally relevant tasks are ordered by due date
+SEARCH = """
+SELECT t.id, t.project_id, t.project_name, t.title, t.due_date
+FROM tasks_fts JOIN tasks t ON t.rowid = tasks_fts.rowid
+WHERE tasks_fts MATCH ?
+ORDER BY round(bm25(tasks_fts), 1), t.due_date = '', t.due_date
+LIMIT ?
+"""
+
+
+def has_fts5():
+    try:
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE VIRTUAL TABLE probe USING fts5(a)")
+        connection.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def to_fts_query(query):
+    # every word is matched as a prefix, all of them have to match
+    terms = []
+    for word in query.split():
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return " ".join(terms)
+
+
+def task_row(task, project_name):
+    return (
+        task["id"],
+        task.get("projectId", ""),
+        project_name,
+        task.get("title") or "",
+        " ".join(filter(None, [task.get("content"), task.get("desc")])),
+        " ".join(task.get("tags") or []),
+        task.get("dueDate") or "",
+        task.get("priority") or 0,
+    )
+
+
+class SyncReport:
+
+    __slots__ = ("total", "done", "failed", "changed", "rows", "bytes", "duration")
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        # projects whose data changed and rows written
+        self.changed = 0
+        self.rows = 0
+        self.bytes = 0
+        self.duration = None
+
+    def __str__(self):
+        return (
+            f"{self.done}/{self.total} projects, {self.failed} failed, "
+            f"{self.changed} changed, {self.rows} rows written, "
+            f"{self.bytes / 1024:.1f} KiB"
+            + (f" in {self.duration:.2f}s" if self.duration is not None else "")
+        )
+
+
+class TaskIndex:
+
+    FILENAME = "tasks.db"
+
+    DEFAULT_REFRESH_INTERVAL = 900
+
+    # concurrent project data requests
+    SYNC_WORKERS = 6
+
+    def __init__(self, on_refresh=None, filename=None):
+        self.on_refresh = on_refresh
+        self.filename = filename if filename else get_path(self.FILENAME)
+        self.refresh_interval = self.DEFAULT_REFRESH_INTERVAL
+        self.available = has_fts5()
+
+        self._local = threading.local()
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._api = None
+        self._get_projects = None
+
+        # the running or last finished sync
+        self.report = None
+
+        if not self.available:
+            logger.warning("SQLite lacks FTS5, task search is disabled")
+
+    def _connection(self):
+        # SQLite connections must not be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            connection = sqlite3.connect(self.filename)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def replace_project(self, project, tasks, digest=""):
+        # unchanged rows are not written, returns the number of written rows
+        connection = self._connection()
+        rows = [task_row(task, project.get("name", "")) for task in tasks]
+        with connection:
+            ids = [row[0] for row in rows]
+            deleted = connection.execute(
+                "DELETE FROM tasks WHERE project_id = ? "
+                f"AND id NOT IN ({','.join('?' * len(ids))})",
+                [project["id"]] + ids,
+            ).rowcount
+            written = connection.executemany(UPSERT, rows).rowcount
+            connection.execute(
+                "INSERT OR REPLACE INTO projects (id, hash) VALUES (?, ?)",
+                (project["id"], digest),
+            )
+        return deleted + written
+
+    def project_hashes(self):
+        # the sync cursor, hashes of the last stored payload of every project
+        return dict(self._connection().execute("SELECT id, hash FROM projects"))
+
+    def search(self, query, max_matches=10):
+        fts_query = to_fts_query(query)
+        if not self.available or not fts_query:
+            return []
+
+        cursor = self._connection().execute(SEARCH, (fts_query, max_matches))
+        return [
+            {
+                "id": row[0],
+                "project_id": row[1],
+                "project_name": row[2],
+                "title": row[3],
+                "due_date": row[4],
+            }
+            for row in cursor
+        ]
+
+    def tag_counts(self):
+        counts = dict()
+        for (tags,) in self._connection().execute(
+            "SELECT tags FROM tasks WHERE tags != ''"
+        ):
+            for tag in tags.split():
+                counts[tag] = counts.get(tag, 0) + 1
+        return counts
+
+    def set_refresh_interval(self, interval):
+        try:
+            self.refresh_interval = max(int(interval), 1)
+        except (TypeError, ValueError):
+            return
+        self._wakeup.set()
+
+    def retain_projects(self, project_ids):
+        # drops the tasks of deleted projects, or of another account
+        connection = self._connection()
+        placeholders = ",".join("?" * len(project_ids))
+        with connection:
+            connection.execute(
+                f"DELETE FROM tasks WHERE project_id NOT IN ({placeholders})",
+                project_ids,
+            )
+            connection.execute(
+                f"DELETE FROM projects WHERE id NOT IN ({placeholders})",
+                project_ids,
+            )
+
+    def _fetch(self, project):
+        response = self._api.get_project_data(project["id"])
+        if not response.ok:
+            raise RuntimeError(f"status {response.status_code}")
+        return response.content
+
+    @stats.timed("sync")
+    def refresh(self):
+        # project data is fetched concurrently, all writes happen on this
+        # thread, projects whose payload is unchanged are skipped
+        start = time.monotonic()
+        projects = list(self._get_projects())
+        if not projects:
+            # the projects are not known yet or could not be fetched, which
+            # must not drop the index
+            logger.debug("No projects to sync tasks of")
+            return
+        self.retain_projects([project["id"] for project in projects])
+        hashes = self.project_hashes()
+
+        report = self.report = SyncReport(len(projects))
+        with ThreadPoolExecutor(self.SYNC_WORKERS) as executor:
+            futures = {
+                executor.submit(self._fetch, project): project for project in projects
+            }
+            for future in as_completed(futures):
+                project = futures[future]
+                report.done += 1
+                try:
+                    content = future.result()
+                except Exception as err:
+                    logger.warning(f'Cannot fetch tasks of "{project["name"]}": {err}')
+                    report.failed += 1
+                    continue
+
+                report.bytes += len(content)
+                # stored rows carry the project name, so a rename is a change
+                digest = hashlib.sha1(
+                    project.get("name", "").encode("utf-8") + b"\0" + content
+                ).hexdigest()
+                if hashes.get(project["id"]) == digest:
+                    continue
+
+                tasks = json.loads(content).get("tasks", [])
+                report.changed += 1
+                report.rows += self.replace_project(project, tasks, digest)
+
+        report.duration = time.monotonic() - start
+        logger.info(f"Synced tasks: {report}")
+
+        if self.on_refresh and report.changed:
+            self.on_refresh()
+
+    def start(self, api, get_projects):
+        # indexes the tasks of all projects returned by get_projects on a
+        # background thread, so that the query path is never blocked
+        if not self.available or self._thread is not None:
+            return
+        self._api = api
+        self._get_projects = get_projects
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            if self._api.access_token:
+                try:
+                    self.refresh()
+                except Exception as err:
+                    logger.warning(f"Cannot index tasks: {err}")
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
@@ -0,0 +1,146 @@
+import json
+import time
+import functools
+import threading
+
+from collections import deque
+
+from storage import write_atomic
+
+
+class Histogram:
+
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window):
+        # the most recent samples, in seconds
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": self.count}
+
+        def percentile(q):
+            return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": samples[-1],
+        }
+
+
+class _Timer:
+
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Stats:
+
+    WINDOW = 512
+
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.window = window
+        self.histograms = dict()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(self.window))
+        histogram.record(seconds)
+
+    def timer(self, name):
+        # a shared no-op context manager keeps the overhead low while
+        # instrumentation is disabled
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self):
+        with self._lock:
+            names = sorted(self.histograms.keys())
+        return {name: self.histograms[name].summary() for name in names}
+
+    def to_prometheus(self):
+        lines = [
+            "# TYPE ticktick_latency_seconds summary",
+        ]
+        for name, summary in self.snapshot().items():
+            label = f'stage="{name}"'
+            for q in ("p50", "p95", "p99"):
+                if q in summary:
+                    quantile = f"0.{q[1:]}"
+                    lines.append(
+                        f'ticktick_latency_seconds{{{label},quantile="{quantile}"}} '
+                        f"{summary[q]:.6f}"
+                    )
+            lines.append(
+                f"ticktick_latency_seconds_sum{{{label}}} {summary.get('sum', 0):.6f}"
+            )
+            lines.append(
+                f"ticktick_latency_seconds_count{{{label}}} {summary['count']}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename):
+        # the format follows the file extension, .prom or JSON otherwise
+        if filename.endswith(".prom"):
+            write_atomic(filename, self.to_prometheus())
+        else:
+            write_atomic(filename, json.dumps(self.snapshot(), indent=2))
+
+
+stats = Stats()
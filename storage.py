@@ -0,0 +1,40 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "~/.config/ulauncher/ext_preferences/ulauncher-ticktick"
+
+
+def get_path(name):
+    return os.path.join(os.path.expanduser(DATA_DIR), name)
+
+
+def write_atomic(filename, data, mode=None):
+    # write to a temporary file first and rename it, so readers never see
+    # a partially written file
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w") as f:
+        if mode is not None:
+            os.chmod(tmp_filename, mode)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def read_json(filename, default=None):
+    if not os.path.isfile(filename):
+        return default
+    try:
+        with open(filename, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as err:
+        logger.warning(f'Cannot read "{filename}": {err}')
+        return default
+
+
+def write_json(filename, data, mode=None):
+    write_atomic(filename, json.dumps(data), mode)
@@ -0,0 +1,165 @@
+import math
+import time
+import logging
+import threading
+
+from storage import get_path, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+# a use counts half as much after this many seconds
+HALF_LIFE = 14 * 24 * 3600
+
+
+def add_use(rank, timestamp):
+    # ranks are the binary logarithm of the sum of 2^(t / HALF_LIFE) over all
+    # uses, all ranks decay at the same pace, so their order never changes
+    # and does not have to be recomputed as time passes
+    use = timestamp / HALF_LIFE
+    if rank is None:
+        return use
+    high, low = max(rank, use), min(rank, use)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+class TagEntry:
+
+    __slots__ = ("name", "count", "last_used", "rank")
+
+    def __init__(self, name, count=0, last_used=0, rank=None):
+        self.name = name
+        self.count = count
+        self.last_used = last_used
+        self.rank = rank
+
+
+class TagIndex:
+
+    FILENAME = "tags.json"
+
+    # number of suggestions kept per prefix, plus one for the tag which
+    # equals the prefix and is not suggested
+    TOP_K = 10 + 1
+
+    # seconds recorded uses are collected before they are written
+    SAVE_DELAY = 30
+
+    def __init__(self, filename=None):
+        self.filename = filename if filename else get_path(self.FILENAME)
+        # incremented whenever the suggestions change
+        self.version = 0
+
+        self._tags = dict()
+        # a node is [children, top keys], every node keeps the best ranked
+        # keys below it, so a lookup only walks the prefix
+        self._root = [dict(), []]
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tags)
+
+    def load(self):
+        data = read_json(self.filename, dict())
+        with self._lock:
+            for name, (count, last_used, rank) in data.get("tags", {}).items():
+                self._tags[name.casefold()] = TagEntry(name, count, last_used, rank)
+            # inserting by decreasing rank fills every node in order
+            for key in sorted(self._tags, key=lambda key: -self._tags[key].rank):
+                self._insert(key, append=True)
+            self.version += 1
+        logger.debug(f'Loaded {len(self._tags)} tags from "{self.filename}"')
+
+    def _schedule(self):
+        # changes in quick succession are written at once
+        if self._timer is None:
+            self._timer = threading.Timer(self.SAVE_DELAY, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            data = {
+                "tags": {
+                    entry.name: [entry.count, entry.last_used, entry.rank]
+                    for entry in self._tags.values()
+                }
+            }
+        write_json(self.filename, data)
+
+    def _insert(self, key, append=False):
+        rank = self._tags[key].rank
+        node = self._root
+        nodes = [node]
+        for c in key:
+            node = node[0].setdefault(c, [dict(), []])
+            nodes.append(node)
+
+        for node in nodes:
+            top = node[1]
+            if append:
+                if len(top) < self.TOP_K:
+                    top.append(key)
+                continue
+
+            # lists are replaced rather than modified, readers on other
+            # threads always see a consistent list
+            top = [other for other in top if other != key]
+            i = 0
+            while i < len(top) and self._tags[top[i]].rank >= rank:
+                i += 1
+            if i < self.TOP_K:
+                top.insert(i, key)
+                node[1] = top[: self.TOP_K]
+
+    def record(self, tags, timestamp=None):
+        if not tags:
+            return
+        timestamp = timestamp if timestamp else time.time()
+        with self._lock:
+            for name in tags:
+                key = name.casefold()
+                entry = self._tags.get(key)
+                if entry is None:
+                    entry = self._tags[key] = TagEntry(name)
+                entry.name = name
+                entry.count += 1
+                entry.last_used = timestamp
+                entry.rank = add_use(entry.rank, timestamp)
+                self._insert(key)
+            self.version += 1
+            self._schedule()
+
+    def seed(self, counts, timestamp=None):
+        # adds tags found in synced tasks which have not been used from here
+        timestamp = timestamp if timestamp else time.time()
+        with self._lock:
+            added = False
+            for name, count in counts.items():
+                key = name.casefold()
+                if key in self._tags:
+                    continue
+                rank = timestamp / HALF_LIFE + math.log2(count)
+                self._tags[key] = TagEntry(name, count, 0, rank)
+                self._insert(key)
+                added = True
+            if added:
+                self.version += 1
+                self._schedule()
+
+    def suggest(self, prefix, max_matches=0):
+        # returns the names of the best ranked tags that strictly extend
+        # prefix, best first
+        key = prefix.casefold()
+        node = self._root
+        for c in key:
+            node = node[0].get(c)
+            if node is None:
+                return []
+
+        names = [self._tags[other].name for other in node[1] if other != key]
+        return names[: max_matches or self.TOP_K - 1]
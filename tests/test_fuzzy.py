@@ -0,0 +1,62 @@
+import random
+
+from fuzzy import FuzzyCandidate, FuzzyMatcher
+
+
+def brute_force(matcher, query, max_matches):
+    entries = []
+    for candidate in matcher.candidates:
+        if candidate.key == query:
+            continue
+        score = candidate.score(query)
+        if score is not None:
+            entries.append((score, -candidate.order, candidate.value))
+    return [value for _, _, value in sorted(entries, reverse=True)[:max_matches]]
+
+
+def is_subsequence(query, key):
+    chars = iter(key)
+    return all(c in chars for c in query)
+
+
+def test_every_subsequence_matches():
+    rng = random.Random(3)
+    alphabet = "abcor k-"
+    for _ in range(2000):
+        key = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        query = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+        if is_subsequence(query, key):
+            assert FuzzyCandidate(key, key, 0).score(query) is not None, (query, key)
+
+    matcher = FuzzyMatcher([("xab ac", "xab ac")])
+    assert matcher.search("ab") == ["xab ac"]
+
+
+def test_separator_gets_both_bonuses():
+    matcher = FuzzyMatcher(
+        [("a bx c", "a bx c"), ("a b c zzzzzzzzzzzzzzzzzzzzzzzz", "long")]
+    )
+    assert matcher.search("a b c", 1) == ["long"]
+
+
+def test_top_k_matches_brute_force():
+    rng = random.Random(7)
+    words = ["a", "b", "ab", "work", "home", "q3", "x-y", "re.port"]
+    separators = [" ", "-", ".", "/", ""]
+    names = {
+        rng.choice(separators).join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+        + "z" * rng.randint(0, 30)
+        for _ in range(500)
+    }
+    matcher = FuzzyMatcher((name, name) for name in names)
+
+    queries = ["a b", "a b c", "w h", "x-y", "re.p", "q3 a", "a.b", "b/w", "a-b "]
+    # mid-word characters
+    queries += ["o", "e", "z", "ork", "orkz", "b w", "3", "y-r", "or.p"]
+    queries += [
+        "".join(rng.choice("abhkmoprwxyz .-") for _ in range(3)) for _ in range(50)
+    ]
+    for query in queries:
+        for max_matches in (1, 3, 10):
+            expected = brute_force(matcher, query, max_matches)
+            assert matcher.search(query, max_matches) == expected, query
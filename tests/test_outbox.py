@@ -0,0 +1,44 @@
+import datetime
+
+from outbox import Outbox
+
+
+def test_append_after_a_torn_last_record(tmp_path):
+    filename = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(filename)
+    outbox.append({"title": "a", "date": datetime.date(2024, 1, 31)})
+    outbox.sync()
+    # a crash in the middle of writing the next record
+    outbox._file.write('{"op": "add", "id": "torn", "da')
+    outbox.close()
+
+    outbox = Outbox(filename)
+    outbox.append({"title": "b"})
+    outbox.sync()
+    outbox.close()
+
+    outbox = Outbox(filename)
+    titles = [data["title"] for data in outbox._pending.values()]
+    outbox.close()
+    assert titles == ["a", "b"]
+
+
+def test_batch_counts_survive_a_restart(tmp_path):
+    filename = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(filename)
+    ids = [
+        outbox.append({"title": title, "batch": "b", "batch_size": 3})
+        for title in ("a", "b", "c")
+    ]
+    assert outbox.ack(ids[0]) is None
+    outbox.close()
+
+    outbox = Outbox(filename)
+    assert outbox.drop(ids[1]) is None
+    # the journal is rewritten with the counts of the batch
+    outbox._compact()
+    outbox.close()
+
+    outbox = Outbox(filename)
+    assert outbox.ack(ids[2]) == [2, 1]
+    outbox.close()
@@ -0,0 +1,139 @@
+import datetime
+
+from clock import Clock
+from parser import StringParser
+
+
+class FrozenClock(Clock):
+    def _local(self):
+        return (2024, 5, 15), "UTC"
+
+    def now(self):
+        return datetime.datetime(2024, 5, 15, 12, 0)
+
+
+def make_parser(*names):
+    parser = StringParser()
+    parser.init_projects(
+        [{"id": f"id{i}", "name": name} for i, name in enumerate(names)]
+    )
+    return parser
+
+
+def test_project_suggestions_extend_a_complete_project_name():
+    parser = make_parser("Work", "Work Inbox", "Home")
+    for query in ("x ~Work ", "x ~Work I", "x ~Work Inb"):
+        base, suggestions = parser.get_project_suggestions(query, 10)
+        assert suggestions == ["Work Inbox"], query
+        assert base == "x "
+
+
+def test_project_suggestions_end_once_nothing_matches():
+    parser = make_parser("Work", "Work Inbox")
+    assert parser.get_project_suggestions("x ~Work qqq", 10)[1] == []
+
+
+def test_superscript_digits_do_not_start_a_relative_date():
+    task = StringParser().parse("x in ² days")
+    assert task.date is None
+    assert task.title == "x in ² days"
+
+
+def test_plural_of_a_single_day_is_parsed_but_not_suggested():
+    parser = StringParser()
+    assert parser.parse("x in 1 days").title == "x"
+    keywords = [key for key, _ in parser.get_date_suggestions("x in 1", 10)[1]]
+    assert keywords[:2] == ["in 1 day", "in 1 week"]
+
+
+def test_project_suggestions_match_within_words():
+    parser = make_parser("Work Orders", "Homework")
+    assert sorted(parser.get_project_suggestions("buy ~ork", 10)[1]) == [
+        "Homework",
+        "Work Orders",
+    ]
+
+
+# results of the former chain of extract_hashtags, extract_priority,
+# extract_time and extract_project on 2024-05-15 at noon
+BASELINE = [
+    ("buy milk", ("buy milk", [], "", None, None, "", "")),
+    (
+        "buy milk #home #errand !h tomorrow 9:30 ~Work",
+        (
+            "buy milk",
+            ["home", "errand"],
+            "high",
+            datetime.date(2024, 5, 16),
+            datetime.time(9, 30),
+            "Work",
+            "2",
+        ),
+    ),
+    (
+        "call mom !low today",
+        ("call mom", [], "low", datetime.date(2024, 5, 15), None, "", ""),
+    ),
+    (
+        "report 12.05. ~Shopping list",
+        ("report", [], "", datetime.date(2025, 5, 12), None, "Shopping list", "3"),
+    ),
+    (
+        "report 05/17/25 17:45",
+        ("report", [], "", datetime.date(2025, 5, 17), datetime.time(17, 45), "", ""),
+    ),
+    (
+        "trip 2024-06-01 #travel",
+        ("trip", ["travel"], "", datetime.date(2024, 6, 1), None, "", ""),
+    ),
+    ("book May 4th 2025", ("book", [], "", datetime.date(2025, 5, 4), None, "", "")),
+    ("plan next week", ("plan", [], "", datetime.date(2024, 5, 20), None, "", "")),
+    (
+        "plan next month !m",
+        ("plan", [], "medium", datetime.date(2024, 6, 1), None, "", ""),
+    ),
+    ("buy ~Work ~Work", ("buy", [], "", None, None, "Work", "2")),
+    ("next week next week", ("", [], "", datetime.date(2024, 5, 20), None, "", "")),
+    ("!h call !h", ("call", [], "high", None, None, "", "")),
+    (
+        "9:30 write 9:30 ~Inbox",
+        (
+            "write",
+            [],
+            "",
+            datetime.date(2024, 5, 16),
+            datetime.time(9, 30),
+            "Inbox",
+            "1",
+        ),
+    ),
+    ("tod milk tod", ("milk", [], "", datetime.date(2024, 5, 15), None, "", "")),
+    (
+        "email team 8:00",
+        ("email team", [], "", datetime.date(2024, 5, 16), datetime.time(8, 0), "", ""),
+    ),
+    ("~Inbox ~Work milk", ("~Work milk", [], "", None, None, "Inbox", "1")),
+]
+
+
+def test_parse_matches_the_former_extract_chain():
+    parser = StringParser(FrozenClock())
+    parser.init_projects(
+        [
+            {"id": "1", "name": "Inbox"},
+            {"id": "2", "name": "Work"},
+            {"id": "3", "name": "Shopping list"},
+        ]
+    )
+    for query, expected in BASELINE:
+        task = parser.parse(query)
+        result = (
+            task.title,
+            task.tags,
+            task.priority,
+            task.date,
+            task.time,
+            task.project_name,
+            task.project_id,
+        )
+        assert result == expected, query
@@ -0,0 +1,28 @@
+from ratelimit import RateLimiter
+
+
+def test_requests_are_not_limited_until_throttled():
+    limiter = RateLimiter()
+    assert sum(limiter.acquire() for i in range(100)) == 0
+    assert limiter.rate is None
+
+    limiter.update(429)
+    assert limiter.rate == RateLimiter.MAX_RATE * RateLimiter.DECREASE
+    assert limiter.acquire() > 0
+
+
+def test_disabled_limiter_ignores_throttling():
+    limiter = RateLimiter(enabled=False)
+    assert limiter.update(429, "5") is None
+    assert limiter.acquire() == 0
+
+
+def test_server_errors_only_decrease_the_rate_with_retry_after():
+    limiter = RateLimiter()
+    for status_code in (500, 502, 503):
+        limiter.update(status_code)
+    assert limiter.rate is None
+    assert limiter.server_errors == 3
+
+    limiter.update(503, "1")
+    assert limiter.rate is not None
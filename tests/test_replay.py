@@ -0,0 +1,87 @@
+import os
+import sys
+import types
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "tools"))
+
+from bench_parser import generate_projects
+from replay import ReplayExtension, keystrokes, replay
+
+# seconds from the last keystroke to its rendered result
+BOUND = 0.05
+
+ULAUNCHER = {
+    "ulauncher.api.client.Extension": ["Extension"],
+    "ulauncher.api.client.EventListener": ["EventListener"],
+    "ulauncher.api.shared.event": [
+        "KeywordQueryEvent",
+        "ItemEnterEvent",
+        "PreferencesEvent",
+        "PreferencesUpdateEvent",
+        "SystemExitEvent",
+    ],
+    "ulauncher.api.shared.item.ExtensionResultItem": ["ExtensionResultItem"],
+    "ulauncher.api.shared.item.ExtensionSmallResultItem": ["ExtensionSmallResultItem"],
+    "ulauncher.api.shared.action.SetUserQueryAction": ["SetUserQueryAction"],
+    "ulauncher.api.shared.action.RenderResultListAction": ["RenderResultListAction"],
+    "ulauncher.api.shared.action.DoNothingAction": ["DoNothingAction"],
+    "ulauncher.api.shared.action.HideWindowAction": ["HideWindowAction"],
+    "ulauncher.api.shared.action.ExtensionCustomAction": ["ExtensionCustomAction"],
+    "ulauncher.api.shared.action.OpenUrlAction": ["OpenUrlAction"],
+    "ulauncher.api.shared.Response": ["Response"],
+}
+
+
+class Stub:
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+
+def stub_ulauncher(monkeypatch):
+    # the listener only needs the names, Ulauncher is not installed here
+    for name, classes in ULAUNCHER.items():
+        parts = name.split(".")
+        for i in range(1, len(parts)):
+            parent = ".".join(parts[:i])
+            if parent not in sys.modules:
+                monkeypatch.setitem(sys.modules, parent, types.ModuleType(parent))
+        module = types.ModuleType(name)
+        for cls in classes:
+            setattr(module, cls, type(cls, (Stub,), {}))
+        monkeypatch.setitem(sys.modules, name, module)
+
+
+def test_last_keystroke_is_rendered_within_the_bound(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    try:
+        import ulauncher  # noqa: F401
+    except ImportError:
+        stub_ulauncher(monkeypatch)
+        monkeypatch.delitem(sys.modules, "main", raising=False)
+
+    from main import KeywordQueryEventListener
+    from credentials import TokenManager
+    from tags import TagIndex
+    from usage import UsageStats
+    from ticktick import TickTickApi
+
+    rng = random.Random(42)
+    projects = generate_projects(rng, 5000)
+
+    # no connection is opened to the real API
+    api = TickTickApi()
+    api.set_warm_up_window(0)
+    listener = KeywordQueryEventListener(api, TagIndex(), UsageStats())
+    listener.parser.init_projects(projects)
+    tokens = TokenManager()
+    tokens.set("token")
+    extension = ReplayExtension(tokens)
+
+    for _ in range(5):
+        stream = keystrokes(rng, projects)
+        listener.results.clear()
+        latency, _ = replay(listener, extension, stream, 0.002, 5)
+        assert latency is not None, stream[-1]
+        assert latency < BOUND, stream[-1]
@@ -0,0 +1,18 @@
+import pytest
+
+from search import TaskIndex, has_fts5
+
+pytestmark = pytest.mark.skipif(not has_fts5(), reason="SQLite lacks FTS5")
+
+
+def test_refresh_without_projects_keeps_the_index(tmp_path):
+    index = TaskIndex(filename=str(tmp_path / "tasks.db"))
+    project = {"id": "p1", "name": "Work"}
+    index.replace_project(project, [{"id": "t1", "title": "Write report"}], "hash")
+
+    # the project list is empty until it is fetched
+    index._get_projects = lambda: []
+    index.refresh()
+
+    assert [task["id"] for task in index.search("report")] == ["t1"]
+    assert index.project_hashes() == {"p1": "hash"}
@@ -0,0 +1,17 @@
+import os
+
+from tags import TagIndex
+
+
+def test_recorded_tags_are_written_on_flush(tmp_path):
+    filename = str(tmp_path / "tags.json")
+    tags = TagIndex(filename)
+    tags.record(["work", "home"])
+    tags.record(["work"])
+    assert tags.suggest("w") == ["work"]
+    assert not os.path.exists(filename)
+
+    tags.flush()
+    loaded = TagIndex(filename)
+    loaded.load()
+    assert loaded.suggest("") == ["work", "home"]
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "tools"))
+
+from fakeapi import FakeTickTick
+from outbox import Outbox
+from ratelimit import RateLimiter
+from ticktick import TickTickApi
+from worker import SubmissionWorker
+
+
+def task(title, **kwargs):
+    data = {
+        "title": title,
+        "project_id": "",
+        "tags": [],
+        "priority": 0,
+        "date": None,
+        "time": None,
+        "timezone": None,
+    }
+    data.update(kwargs)
+    return data
+
+
+def start_worker(api, filename, statuses):
+    worker = SubmissionWorker(
+        api, Outbox(filename), max_workers=2, notify=lambda *args: statuses.append(args)
+    )
+    worker.MIN_RETRY_DELAY = 0.05
+    worker.MAX_RETRY_DELAY = 0.1
+    return worker
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_tasks_queued_during_an_outage_are_created_once(tmp_path):
+    fake = FakeTickTick().start()
+    fake.available = False
+    limiter = RateLimiter(enabled=False)
+    api = TickTickApi("token", api_url=fake.url, auth_url=fake.url, limiter=limiter)
+    filename = str(tmp_path / "outbox.jsonl")
+    statuses = []
+
+    worker = start_worker(api, filename, statuses)
+    worker.submit(task("single"))
+    worker.submit_many([task(f"batch {i}") for i in range(3)])
+    wait_for(lambda: fake.counts.get(503, 0) >= 4)
+
+    # the extension is restarted while TickTick is still unavailable
+    worker.shutdown(5)
+    worker = start_worker(api, filename, statuses)
+    worker.start()
+    fake.available = True
+    worker.resume()
+    wait_for(lambda: len(worker.outbox) == 0)
+    worker.shutdown(5)
+    api.close()
+    fake.stop()
+
+    titles = sorted(task["title"] for task in fake.tasks)
+    assert titles == ["batch 0", "batch 1", "batch 2", "single"]
+    assert ("Task created", "3 of 3 tasks created") in statuses
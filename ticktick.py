@@ -1,21 +1,200 @@
-import requests
+import time
 import datetime
-from zoneinfo import ZoneInfo
 import logging
+import threading
 
 from urllib.parse import urlencode
 
+from stats import stats
+from ratelimit import RateLimiter
+
 
 logger = logging.getLogger(__name__)
 
 
 class TickTickApi:
 
-    access_token = ""
+    API_URL = "https://api.ticktick.com"
+    AUTH_URL = "https://ticktick.com"
+
+    # (connect, read) timeouts in seconds
+    TIMEOUT = (3.05, 10)
+
+    # shared by the submission worker and the task sync
+    POOL_SIZE = 10
+
+    # attempts of a request that is throttled or hits a server error
+    MAX_ATTEMPTS = 4
+
+    # seconds a connection opened by warm_up is kept alive, 0 disables
+    # warming up
+    WARM_UP_WINDOW = 60
+
+    # seconds without a request after which the warm connection is pinged
+    KEEPALIVE_INTERVAL = 30
 
-    def __init__(self, access_token=""):
+    def __init__(
+        self, access_token="", api_url=API_URL, auth_url=AUTH_URL, limiter=None
+    ):
+        self.api_url = api_url
+        self.auth_url = auth_url
+
+        # shared by all requests of the client
+        self.limiter = limiter if limiter else RateLimiter()
+
+        self.warm_up_window = self.WARM_UP_WINDOW
+        self._used_at = None
+        self._warm_until = 0
+        self._warm_thread = None
+        self._warm_lock = threading.Lock()
+
+        self._session = None
+        self._session_lock = threading.Lock()
         self.access_token = access_token
 
+        # called with every response
+        self.on_response = None
+
+    @property
+    def session(self):
+        # requests is only imported once the first request is made, which
+        # keeps it off the extension's startup path
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # connection errors are retried for every method as the request has
+        # not been sent, read errors only for idempotent requests, responses
+        # are retried by _request under the rate limiter
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=1,
+            status=0,
+            backoff_factor=0.3,
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=2, pool_maxsize=self.POOL_SIZE, max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.hooks["response"].append(self._observe)
+        if self._access_token:
+            session.headers["Authorization"] = f"Bearer {self._access_token}"
+        return session
+
+    def _observe(self, response, *args, **kwargs):
+        if self.on_response:
+            self.on_response(response)
+
+    @property
+    def access_token(self):
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, access_token):
+        self._access_token = access_token
+        if self._session is None:
+            return
+        if access_token:
+            self._session.headers["Authorization"] = f"Bearer {access_token}"
+        else:
+            self._session.headers.pop("Authorization", None)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def _retryable(self, method, status_code):
+        # a throttled request was not processed, server errors are only
+        # retried for idempotent requests
+        if status_code == 429:
+            return True
+        return method == "GET" and status_code in (500, 502, 503, 504)
+
+    def set_warm_up_window(self, window):
+        try:
+            self.warm_up_window = max(int(window), 0)
+        except (TypeError, ValueError):
+            logger.warning(f'Invalid warm-up window "{window}"')
+
+    def warm_up(self):
+        # opens a connection to the API in the background and keeps it alive
+        # for the warm-up window, so that a task created meanwhile skips the
+        # TCP and TLS handshakes. Every call extends the window.
+        if not self.warm_up_window:
+            return
+        with self._warm_lock:
+            self._warm_until = time.monotonic() + self.warm_up_window
+            if self._warm_thread is not None:
+                return
+            self._warm_thread = threading.Thread(
+                target=self._keep_warm, name="warm-up", daemon=True
+            )
+            self._warm_thread.start()
+
+    def _keep_warm(self):
+        while True:
+            idle = None if self._used_at is None else time.monotonic() - self._used_at
+            if idle is None or idle >= self.KEEPALIVE_INTERVAL:
+                self._ping()
+
+            with self._warm_lock:
+                remaining = self._warm_until - time.monotonic()
+                if remaining <= 0:
+                    self._warm_thread = None
+                    return
+            time.sleep(min(remaining, self.KEEPALIVE_INTERVAL))
+
+    def _ping(self):
+        # the request is sent without the token, its response neither counts
+        # for the rate limiter nor validates the token
+        try:
+            with stats.timer("api.warm_up"):
+                self.session.head(
+                    self.api_url,
+                    headers={"Authorization": None},
+                    timeout=self.TIMEOUT,
+                    allow_redirects=False,
+                )
+            self._used_at = time.monotonic()
+        except Exception as err:
+            logger.debug(f"Cannot warm up the connection: {err}")
+
+    def _request(self, method, url, **kwargs):
+        for attempt in range(self.MAX_ATTEMPTS):
+            self.limiter.acquire()
+            response = self.session.request(method, url, timeout=self.TIMEOUT, **kwargs)
+            self._used_at = time.monotonic()
+            retry_after = self.limiter.update(
+                response.status_code, response.headers.get("Retry-After")
+            )
+
+            if attempt + 1 == self.MAX_ATTEMPTS or not self._retryable(
+                method, response.status_code
+            ):
+                return response
+
+            delay = self.limiter.backoff(attempt, retry_after)
+            logger.debug(
+                f"Retrying {method} {url} in {delay:.2f}s: {response.status_code}"
+            )
+            response.close()
+            time.sleep(delay)
+
+    @stats.timed("api.create_task")
     def create_task(self, title, project_id, tags, priority, adate, atime, atimezone):
 
         reminders = []
@@ -42,6 +221,8 @@ class TickTickApi:
                 adatetime = datetime.datetime(adate.year, adate.month, adate.day)
                 isAllDay = True
 
+            from zoneinfo import ZoneInfo
+
             adatetime = adatetime.replace(tzinfo=ZoneInfo('localtime'))
 
             formatted_date = adatetime.strftime("%Y-%m-%dT%H:%M:%S%z")
@@ -56,7 +237,7 @@ class TickTickApi:
             logger.debug(f"Creation of task is skipped as there is no title given.")
             return
 
-        url = "https://api.ticktick.com/open/v1/task"
+        url = f"{self.api_url}/open/v1/task"
         payload = {
             "title": title,
             "priority": priority,
@@ -66,14 +247,10 @@ class TickTickApi:
             "reminders": reminders,
             "desc": desc,
         }
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
-        }
 
-        return requests.post(url, json=payload, headers=headers)
+        return self._request("POST", url, json=payload)
 
-    def get_authorization_uri(client_id, redirect_uri, state):
+    def get_authorization_uri(self, client_id, redirect_uri, state):
 
         data = {
             "scope": "tasks:write tasks:read",
@@ -84,32 +261,43 @@ class TickTickApi:
         }
         encoded_data = urlencode(data)
 
-        return f"https://ticktick.com/oauth/authorize?{encoded_data}"
+        return f"{self.auth_url}/oauth/authorize?{encoded_data}"
 
-    def get_projects(self):
-        url = "https://api.ticktick.com/open/v1/project"
+    @stats.timed("api.get_projects")
+    def get_projects(self, etag=None, last_modified=None):
+        url = f"{self.api_url}/open/v1/project"
 
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-        }
+        headers = dict()
 
-        return requests.get(
-            url,
-            headers=headers,
-        )
+        # conditional request, answered with 304 if the list is unchanged
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        return self._request("GET", url, headers=headers)
+
+    @stats.timed("api.get_project_data")
+    def get_project_data(self, project_id):
+        url = f"{self.api_url}/open/v1/project/{project_id}/data"
 
-    def request_access_token(client_id, client_secret, redirect_uri, code):
-        url = "https://ticktick.com/oauth/token"
+        return self._request("GET", url)
+
+    @stats.timed("api.request_access_token")
+    def request_access_token(self, client_id, client_secret, redirect_uri, code):
+        url = f"{self.auth_url}/oauth/token"
 
         payload = {
             "code": code,
             "grant_type": "authorization_code",
-            "scope": "tasks:write",
+            "scope": "tasks:write tasks:read",
             "redirect_uri": redirect_uri,
         }
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
-        return requests.post(
+        # the basic auth credentials replace the session's bearer token
+        return self._request(
+            "POST",
             url,
             data=urlencode(payload),
             headers=headers,
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clock import Clock
+from parser import StringParser
+
+# the clock is frozen so that relative dates resolve deterministically
+FROZEN_NOW = datetime.datetime(2024, 5, 15, 12, 0, 0)
+
+
+class FrozenClock(Clock):
+    def _local(self):
+        return FROZEN_NOW.timetuple()[:3], "UTC"
+
+    def now(self):
+        return FROZEN_NOW
+
+
+WORDS = [
+    "buy", "milk", "call", "mom", "review", "report", "fix", "the", "bike",
+    "write", "email", "to", "team", "about", "budget", "plan", "trip", "book",
+]  # fmt: skip
+
+EXTRAS = [
+    "#home", "#work", "#errand", "!h", "!low", "!medium", "tomorrow", "today",
+    "next week", "May 4th", "12.05.", "05/17/25", "2024-06-01", "9:30", "17:45",
+]  # fmt: skip
+
+PROJECT_WORDS = [
+    "Work", "Inbox", "Home", "Shopping", "List", "Side", "Project", "Q3",
+    "Team", "C++", "(archive)", "Ideas", "Reading", "Garden", "2024", "A.B",
+]  # fmt: skip
+
+
+def generate_projects(rng, count):
+    projects = []
+    for i in range(count):
+        name = " ".join(rng.sample(PROJECT_WORDS, rng.randint(1, 3)))
+        projects.append({"id": f"p{i}", "name": f"{name} {i}"})
+    return projects
+
+
+def generate_queries(rng, projects, count, num_tokens):
+    queries = []
+    for _ in range(count):
+        tokens = [rng.choice(WORDS) for _ in range(num_tokens)]
+        for _ in range(rng.randint(0, min(3, num_tokens))):
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(EXTRAS))
+        if projects and rng.random() < 0.5:
+            tokens.append("~" + rng.choice(projects)["name"])
+        queries.append(" ".join(tokens))
+    return queries
+
+
+def generate_prefixes(rng, projects, count):
+    # queries ending in a partially typed project or priority
+    queries = []
+    for _ in range(count):
+        base = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+        if projects and rng.random() < 0.7:
+            name = rng.choice(projects)["name"]
+            queries.append(f"tt {base} ~{name[: rng.randint(0, len(name))]}")
+        else:
+            queries.append(f"tt {base} !{rng.choice(['', 'l', 'me', 'hi'])}")
+    return queries
+
+
+def percentile(timings, q):
+    return timings[min(int(len(timings) * q), len(timings) - 1)]
+
+
+def measure(func, queries, rounds):
+    timings = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "p50_us": percentile(timings, 0.50) * 1e6,
+        "p95_us": percentile(timings, 0.95) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+        "ops_per_s": len(timings) / sum(timings),
+    }
+
+
+def run(project_counts, token_counts, num_queries, rounds, seed):
+    results = dict()
+    for num_projects in project_counts:
+        rng = random.Random(seed)
+        projects = generate_projects(rng, num_projects)
+        string_parser = StringParser(FrozenClock())
+        string_parser.init_projects(projects)
+
+        prefixes = generate_prefixes(rng, projects, num_queries)
+        stages = {
+            "get_project_suggestions": lambda q: string_parser.get_project_suggestions(
+                q, max_matches=10
+            ),
+            "get_priority_suggestions": string_parser.get_priority_suggestions,
+        }
+        for stage, func in stages.items():
+            results[f"{stage}/projects={num_projects}"] = measure(
+                func, prefixes, rounds
+            )
+
+        for num_tokens in token_counts:
+            queries = generate_queries(rng, projects, num_queries, num_tokens)
+            stages = {
+                "extract_hashtags": string_parser.extract_hashtags,
+                "extract_priority": string_parser.extract_priority,
+                "extract_time": string_parser.extract_time,
+                "extract_project": string_parser.extract_project,
+                "parse": string_parser.parse,
+            }
+            for stage, func in stages.items():
+                key = f"{stage}/projects={num_projects}/tokens={num_tokens}"
+                results[key] = measure(func, queries, rounds)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # returns the benchmarks whose median got slower than allowed
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["p50_us"]
+        after = result["p50_us"]
+        if after > before * (1 + threshold):
+            regressions.append((key, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the StringParser stages")
+    parser.add_argument(
+        "--projects", type=int, nargs="+", default=[10, 100, 1000, 5000]
+    )
+    parser.add_argument("--tokens", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed relative p50 regression against the baseline",
+    )
+    args = parser.parse_args()
+
+    results = run(args.projects, args.tokens, args.queries, args.rounds, args.seed)
+
+    print(f"{'benchmark':<56} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'ops/s':>10}")
+    for key, result in results.items():
+        print(
+            f"{key:<56} {result['p50_us']:9.1f} {result['p95_us']:9.1f} "
+            f"{result['p99_us']:9.1f} {result['ops_per_s']:10.0f}"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: p50 {before:.1f} us -> {after:.1f} us")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
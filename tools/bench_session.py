@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from ticktick import TickTickApi
+from ratelimit import RateLimiter
+from fakeapi import FakeTickTick
+
+
+def measure(create, count, limiter=None):
+    # waits for the rate limiter are not part of the request
+    timings = []
+    for i in range(count):
+        waited = limiter.waited if limiter else 0.0
+        start = time.perf_counter()
+        response = create(f"Task {i}")
+        timing = time.perf_counter() - start
+        if limiter:
+            timing -= limiter.waited - waited
+        timings.append(timing)
+        response.raise_for_status()
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1000
+    p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{name:>8}: p50 {p50:7.3f} ms, p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare fresh connections against the pooled session"
+    )
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--url", help="use a running server instead")
+    parser.add_argument(
+        "--limit", action="store_true", help="send requests under the rate limiter"
+    )
+    args = parser.parse_args()
+
+    fake = None
+    url = args.url
+    if not url:
+        fake = FakeTickTick(latency=args.latency).start()
+        url = fake.url
+
+    limiter = RateLimiter(enabled=args.limit)
+    api = TickTickApi("token", api_url=url, auth_url=url, limiter=limiter)
+
+    def create_fresh(title):
+        return requests.post(
+            f"{url}/open/v1/task",
+            json={"title": title},
+            headers={"Authorization": "Bearer token"},
+        )
+
+    def create_pooled(title):
+        return api.create_task(title, "", [], 0, None, None, None)
+
+    # warm up both paths once
+    create_fresh("warm-up")
+    create_pooled("warm-up")
+
+    report("fresh", measure(create_fresh, args.count))
+    report("pooled", measure(create_pooled, args.count, limiter))
+
+    api.close()
+    if fake:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ticktick import TickTickApi
+from ratelimit import RateLimiter
+from search import TaskIndex
+from fakeapi import FakeTickTick
+
+
+def sync(fake, filename, workers, limit):
+    limiter = RateLimiter(enabled=limit)
+    api = TickTickApi("token", api_url=fake.url, auth_url=fake.url, limiter=limiter)
+    index = TaskIndex(filename=filename)
+    index.SYNC_WORKERS = workers
+    index._api = api
+    index._get_projects = lambda: fake.projects
+    index.refresh()
+    api.close()
+    return index.report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sync synthetic accounts of varying size into the task index"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--tasks", type=int, default=20, help="per project")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--workers", type=int, default=TaskIndex.SYNC_WORKERS)
+    parser.add_argument(
+        "--limit", action="store_true", help="send requests under the rate limiter"
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        fake = FakeTickTick(
+            latency=args.latency, num_projects=size, tasks_per_project=args.tasks
+        ).start()
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"{size} projects, {size * args.tasks} tasks")
+
+            sequential = sync(
+                fake, os.path.join(directory, "sequential.db"), 1, args.limit
+            )
+            print(f"  sequential cold: {sequential}")
+
+            filename = os.path.join(directory, "tasks.db")
+            print(
+                f"  concurrent cold: {sync(fake, filename, args.workers, args.limit)}"
+            )
+
+            # a restart resumes from the stored hashes
+            print(
+                f"  concurrent warm: {sync(fake, filename, args.workers, args.limit)}"
+            )
+
+            fake.tasks[0]["title"] = "Renamed task"
+            print(
+                f"  one change:      {sync(fake, filename, args.workers, args.limit)}"
+            )
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ticktick import TickTickApi
+from fakeapi import FakeTickTick
+
+
+def time_to_2xx(fake, warm, think):
+    # a fresh client as after the extension started, the task is created
+    # think seconds after the keyword was typed
+    api = TickTickApi("token", api_url=fake.url, auth_url=fake.url)
+    if warm:
+        api.warm_up()
+    time.sleep(think)
+
+    t = time.perf_counter()
+    response = api.create_task("Warm-up test", "inbox", [], 0, None, None, None)
+    elapsed = time.perf_counter() - t
+    api.close()
+    if not response.ok:
+        raise RuntimeError(f"status {response.status_code}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time create_task with and without a warmed-up connection"
+    )
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds")
+    parser.add_argument(
+        "--handshake",
+        type=float,
+        default=0.1,
+        help="seconds added to every new connection",
+    )
+    parser.add_argument(
+        "--think", type=float, default=0.5, help="seconds from keyword to Enter"
+    )
+    args = parser.parse_args()
+
+    fake = FakeTickTick(latency=args.latency, handshake=args.handshake).start()
+    for warm in (False, True):
+        runs = sorted(time_to_2xx(fake, warm, args.think) for _ in range(args.runs))
+        print(
+            f"{'warm' if warm else 'cold'}: p50 {runs[len(runs) // 2] * 1000:.1f} ms"
+            f", max {runs[-1] * 1000:.1f} ms"
+        )
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
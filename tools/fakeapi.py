@@ -0,0 +1,272 @@
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+
+    # keep connections alive like the real API does
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def setup(self):
+        super().setup()
+        # stands in for the TCP and TLS handshakes of a new connection
+        if self.server.fake.handshake:
+            time.sleep(self.server.fake.handshake)
+
+    def _send_json(self, code, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _authorized(self):
+        return self.headers.get("Authorization", "").startswith("Bearer ")
+
+    def _admit(self):
+        # answers requests that are delayed, failed or rate limited by the
+        # configuration, returns whether the request is to be served
+        fake = self.server.fake
+        fake.delay()
+        rejection = fake.admit()
+        if rejection:
+            code, headers = rejection
+            fake.count(code)
+            self._send_json(code, {"error": f"status {code}"}, headers)
+            return False
+        return True
+
+    def _reply(self, code, data, headers=None):
+        self.server.fake.count(code)
+        self._send_json(code, data, headers)
+
+    def do_GET(self):
+        if not self._admit():
+            return
+        path = urlparse(self.path).path
+
+        if not self._authorized():
+            self._reply(401, {"error": "unauthorized"})
+        elif path == "/open/v1/project":
+            etag = self.server.fake.projects_etag()
+            if self.headers.get("If-None-Match") == etag:
+                self.server.fake.count(304)
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                self._reply(200, self.server.fake.projects, {"ETag": etag})
+        elif path.startswith("/open/v1/project/") and path.endswith("/data"):
+            project_id = path[len("/open/v1/project/") : -len("/data")]
+            tasks = [
+                task
+                for task in self.server.fake.tasks
+                if task.get("projectId") == project_id
+            ]
+            self._reply(200, {"project": {"id": project_id}, "tasks": tasks})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_HEAD(self):
+        # used to open connections ahead of requests
+        self.server.fake.count(200)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self._admit():
+            return
+        path = urlparse(self.path).path
+
+        if path == "/oauth/token":
+            token = {
+                "access_token": str(uuid.uuid4()),
+                "token_type": "bearer",
+                "expires_in": 15551999,
+                "scope": "tasks:write tasks:read",
+            }
+            self._reply(200, token)
+        elif not self._authorized():
+            self._reply(401, {"error": "unauthorized"})
+        elif path == "/open/v1/task":
+            task = json.loads(body or b"{}")
+            task["id"] = uuid.uuid4().hex
+            self.server.fake.tasks.append(task)
+            self._reply(200, task)
+        else:
+            self._reply(404, {"error": "not found"})
+
+
+class FakeTickTick:
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        num_projects=10,
+        tasks_per_project=0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=0.0,
+        burst=10,
+        handshake=0.0,
+    ):
+        self.latency = latency
+        # seconds added to the first request of every connection
+        self.handshake = handshake
+        # uniformly distributed extra latency in seconds
+        self.jitter = jitter
+        # share of requests failing with a server error
+        self.error_rate = error_rate
+        # requests per second admitted by a token bucket, 0 for no limit,
+        # others are answered with 429 and Retry-After
+        self.rate_limit = rate_limit
+        self.burst = burst
+        # while unavailable every request is answered with 503
+        self.available = True
+        # number of responses by status code
+        self.counts = dict()
+
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self.projects = [
+            {"id": f"project{i}", "name": f"Project {i}"} for i in range(num_projects)
+        ]
+        # a synthetic account
+        self.tasks = [
+            {
+                "id": f"task{i}-{j}",
+                "projectId": project["id"],
+                "title": f"Task {j} of {project['name']}",
+                "content": "",
+                "tags": [f"tag{j % 7}"],
+                "dueDate": f"2026-{1 + j % 12:02d}-{1 + j % 28:02d}T10:00:00+0000",
+                "priority": j % 2 * 3,
+            }
+            for i, project in enumerate(self.projects)
+            for j in range(tasks_per_project)
+        ]
+
+        self.server = ThreadingHTTPServer((host, port), FakeRequestHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self):
+        latency = self.latency
+        if self.jitter:
+            latency += random.uniform(0, self.jitter)
+        if latency:
+            time.sleep(latency)
+
+    def count(self, code):
+        with self._lock:
+            self.counts[code] = self.counts.get(code, 0) + 1
+
+    def admit(self):
+        # returns the status code and headers of a rejection, or None
+        if not self.available:
+            return 503, None
+
+        if self.rate_limit:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._tokens + (now - self._refilled) * self.rate_limit,
+                    self.burst,
+                )
+                self._refilled = now
+                if self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate_limit
+                    return 429, {"Retry-After": str(math.ceil(wait))}
+                self._tokens -= 1
+
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice((500, 502, 503)), None
+
+        return None
+
+    def projects_etag(self):
+        return f'"{len(self.projects)}-{hash(json.dumps(self.projects)) & 0xffffff:x}"'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the TickTick API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=0, help="per project")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="per second")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--handshake", type=float, default=0.0, help="seconds")
+    args = parser.parse_args()
+
+    fake = FakeTickTick(
+        args.host,
+        args.port,
+        args.latency,
+        args.projects,
+        args.tasks,
+        args.jitter,
+        args.error_rate,
+        args.rate_limit,
+        args.burst,
+        args.handshake,
+    )
+    print(f"Serving fake TickTick API on {fake.url}", file=sys.stderr)
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ticktick import TickTickApi
+from ratelimit import RateLimiter
+from fakeapi import FakeTickTick
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = dict()
+        self.outcomes = dict()
+        self._lock = threading.Lock()
+
+    def record(self, operation, latency, outcome):
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(latency)
+            outcomes = self.outcomes.setdefault(operation, dict())
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def summary(self, duration):
+        result = dict()
+        for operation, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            outcomes = self.outcomes[operation]
+            ok = sum(n for outcome, n in outcomes.items() if outcome in ("200", "304"))
+            result[operation] = {
+                "requests": len(latencies),
+                "ok": ok,
+                "throughput": len(latencies) / duration,
+                "p50": percentile(latencies, 0.5),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1],
+                "outcomes": dict(sorted(outcomes.items())),
+            }
+        return result
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def call(api, operation, rng):
+    if operation == "create_task":
+        title = f"Load test task {rng.randrange(1000000)}"
+        return api.create_task(title, "inbox", ["load"], 0, None, None, None)
+    return api.get_projects()
+
+
+def run(api, recorder, operations, weights, seed, deadline, remaining):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        with remaining["lock"]:
+            if remaining["count"] is not None:
+                if remaining["count"] <= 0:
+                    return
+                remaining["count"] -= 1
+
+        operation = rng.choices(operations, weights)[0]
+        t = time.perf_counter()
+        try:
+            outcome = str(call(api, operation, rng).status_code)
+        except Exception as err:
+            outcome = type(err).__name__
+        recorder.record(operation, time.perf_counter() - t, outcome)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive the TickTick API client at a given concurrency"
+    )
+    parser.add_argument("--url", help="API to test instead of a local fake")
+    parser.add_argument("--token", default="token")
+    parser.add_argument("--concurrency", type=int, default=TickTickApi.POOL_SIZE)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after this many")
+    parser.add_argument(
+        "--mix", type=float, default=0.5, help="share of create_task calls"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument(
+        "--rate", type=float, help="initial rate of the client, per second"
+    )
+    parser.add_argument(
+        "--no-limit", action="store_true", help="disable the client's rate limiter"
+    )
+
+    # options of the local fake
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="per second")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--projects", type=int, default=20)
+    args = parser.parse_args()
+
+    fake = None
+    url = args.url
+    if url is None:
+        fake = FakeTickTick(
+            latency=args.latency,
+            num_projects=args.projects,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit,
+            burst=args.burst,
+        ).start()
+        url = fake.url
+
+    limiter = RateLimiter(rate=args.rate, enabled=not args.no_limit)
+    api = TickTickApi(args.token, api_url=url, auth_url=url, limiter=limiter)
+    recorder = Recorder()
+    remaining = {"count": args.requests, "lock": threading.Lock()}
+    operations = ["create_task", "get_projects"]
+    weights = [args.mix, 1 - args.mix]
+
+    start = time.monotonic()
+    deadline = start + args.duration
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        for i in range(args.concurrency):
+            executor.submit(
+                run,
+                api,
+                recorder,
+                operations,
+                weights,
+                args.seed + i,
+                deadline,
+                remaining,
+            )
+    duration = time.monotonic() - start
+    api.close()
+    if fake:
+        fake.stop()
+
+    summary = recorder.summary(duration)
+    total = sum(result["requests"] for result in summary.values())
+    print(
+        f"{total} requests in {duration:.1f} s at concurrency {args.concurrency}"
+        f", {total / duration:.1f} req/s"
+    )
+    for operation, result in summary.items():
+        outcomes = ", ".join(f"{k}: {v}" for k, v in result["outcomes"].items())
+        print(
+            f"  {operation}: {result['throughput']:.1f} req/s"
+            f", p50 {result['p50'] * 1000:.1f} ms"
+            f", p99 {result['p99'] * 1000:.1f} ms"
+            f", max {result['max'] * 1000:.1f} ms ({outcomes})"
+        )
+    print(f"  rate limiter: {api.limiter}")
+    if fake:
+        print(f"  server responses: {dict(sorted(fake.counts.items()))}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "url": args.url,
+                    "concurrency": args.concurrency,
+                    "duration": duration,
+                    "operations": summary,
+                    "limiter": api.limiter.state(),
+                    "server": fake.counts if fake else None,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parser import WORDS, generate_projects
+
+# the keystrokes of these queries are replayed, {project} is replaced by the
+# prefix of a random project name and {word} by a random word
+TEMPLATES = [
+    "{word} {word} tomorrow ~{project}",
+    "{word} {word} #home !high ~{project}",
+    "{word} next week {word} {word} ~{project}",
+]
+
+
+class ReplayEvent:
+    def __init__(self, query):
+        self.query = query
+
+    def get_query(self):
+        return self.query
+
+    def get_argument(self):
+        return self.query.partition(" ")[2]
+
+
+class ReplayClient:
+    def __init__(self):
+        self.sent = []
+        self.condition = threading.Condition()
+
+    def send(self, event):
+        with self.condition:
+            self.sent.append((time.perf_counter(), event.get_query()))
+            self.condition.notify_all()
+
+    def wait_for(self, query, timeout):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: any(sent == query for _, sent in self.sent), timeout
+            )
+            return next((t for t, sent in self.sent if sent == query), None)
+
+
+class ReplayWorker:
+    def start(self):
+        pass
+
+    def get_statuses(self):
+        return []
+
+
+class ReplayExtension:
+    def __init__(self, tokens):
+        self.client = ReplayClient()
+        self.worker = ReplayWorker()
+        self.tokens = tokens
+        self.preferences = {"client_id": "", "client_secret": ""}
+
+    def send_response(self, event, action):
+        self.client.send(event)
+
+    def get_access_token(self):
+        return "token"
+
+
+def keystrokes(rng, projects):
+    name = rng.choice(projects)["name"]
+    query = rng.choice(TEMPLATES).replace(
+        "{project}", name[: rng.randint(1, len(name))]
+    )
+    while "{word}" in query:
+        query = query.replace("{word}", rng.choice(WORDS), 1)
+    query = f"tt {query}"
+    return [query[:i] for i in range(4, len(query) + 1)]
+
+
+def replay(listener, extension, stream, interval, timeout):
+    # fires the keystrokes at the given interval, returns the seconds from
+    # the last keystroke to its rendered result and the number of renders
+    extension.client.sent.clear()
+    for query in stream:
+        listener.on_event(ReplayEvent(query), extension)
+        last = time.perf_counter()
+        time.sleep(interval)
+    rendered = extension.client.wait_for(stream[-1], timeout)
+    if rendered is None:
+        return None, len(extension.client.sent)
+    return max(rendered - last, 0.0), len(extension.client.sent)
+
+
+def replay_blocking(listener, extension, stream, interval):
+    # the former behaviour, every keystroke is rendered before the next one
+    # is received, the backlog adds up to the latency of the last one
+    pending = []
+    start = time.perf_counter()
+    finished = start
+    for i, query in enumerate(stream):
+        arrival = start + i * interval
+        begin = max(arrival, finished)
+        t = time.perf_counter()
+        generation = listener.dispatcher.generation
+        listener._get_action(ReplayEvent(query), extension, generation)
+        finished = begin + time.perf_counter() - t
+        pending.append(finished - arrival)
+    return pending[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay rapid keystroke streams and check the render latency"
+    )
+    parser.add_argument("--projects", type=int, default=5000)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.002, help="seconds")
+    parser.add_argument("--bound", type=float, default=0.05, help="seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # run against an empty configuration directory
+    home = tempfile.mkdtemp()
+    os.environ["HOME"] = home
+
+    from main import KeywordQueryEventListener
+    from credentials import TokenManager
+    from tags import TagIndex
+    from usage import UsageStats
+    from ticktick import TickTickApi
+
+    rng = random.Random(args.seed)
+    projects = generate_projects(rng, args.projects)
+
+    # no connection is opened to the real API
+    api = TickTickApi()
+    api.set_warm_up_window(0)
+    listener = KeywordQueryEventListener(api, TagIndex(), UsageStats())
+    listener.parser.init_projects(projects)
+    tokens = TokenManager()
+    tokens.set("token")
+    extension = ReplayExtension(tokens)
+
+    latencies = []
+    blocking = []
+    renders = 0
+    total = 0
+    for _ in range(args.streams):
+        stream = keystrokes(rng, projects)
+        listener.results.clear()
+        latency, sent = replay(listener, extension, stream, args.interval, 5)
+        if latency is None:
+            sys.exit(f'No result rendered for "{stream[-1]}"')
+        latencies.append(latency)
+        renders += sent
+        total += len(stream)
+
+        listener.results.clear()
+        blocking.append(replay_blocking(listener, extension, stream, args.interval))
+
+    latencies.sort()
+    blocking.sort()
+    print(f"{total} keystrokes, {renders} rendered, {total - renders} superseded")
+    print(
+        f"last keystroke to result: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms"
+        f", max {latencies[-1] * 1000:.2f} ms"
+    )
+    print(
+        f"rendering every keystroke: p50 {blocking[len(blocking) // 2] * 1000:.2f} ms"
+        f", max {blocking[-1] * 1000:.2f} ms"
+    )
+
+    if latencies[-1] > args.bound:
+        sys.exit(f"Latency exceeds the bound of {args.bound * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
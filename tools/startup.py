@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# executed in a fresh interpreter, prints the seconds from process launch to
+# the first rendered result
+FIRST_RESULT = """
+import os, sys, time
+from ticktick import TickTickApi
+from main import KeywordQueryEventListener
+from tags import TagIndex
+from usage import UsageStats
+listener = KeywordQueryEventListener(TickTickApi(), TagIndex(), UsageStats())
+listener._get_task_items("tt buy milk tomorrow !h", "buy milk tomorrow !h")
+print(time.time() - float(os.environ["STARTUP_LAUNCHED"]))
+"""
+
+
+def import_times(module, env):
+    # returns (cumulative microseconds, module) of every import, parsed from
+    # the -X importtime report
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times.append((int(cumulative), name.rstrip()))
+    return times
+
+
+def time_to_first_result(env):
+    env = dict(env, STARTUP_LAUNCHED=str(time.time()))
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RESULT],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure import time and time to the first result"
+    )
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # run against an empty configuration directory
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home)
+
+        times = import_times(args.module, env)
+        total = next((t for t, name in times if name.strip() == args.module), 0)
+        print(f"import {args.module}: {total / 1000:.1f} ms cumulative")
+        for cumulative, name in sorted(times, reverse=True)[: args.top]:
+            print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+        if args.module == "main":
+            runs = sorted(time_to_first_result(env) for _ in range(args.runs))
+            print(f"time to first result: {runs[len(runs) // 2] * 1000:.1f} ms median")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except RuntimeError as err:
+        sys.exit(f"Measurement failed: {err}")
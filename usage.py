@@ -0,0 +1,96 @@
+import math
+import time
+import logging
+import threading
+
+from storage import get_path, read_json, write_json
+from tags import HALF_LIFE, add_use
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("projects", "priorities")
+
+
+class UsageStats:
+
+    FILENAME = "usage.json"
+
+    # seconds recorded uses are collected before they are written
+    SAVE_DELAY = 30
+
+    # bonus per doubling of the decayed number of uses, up to MAX_BONUS, in
+    # units of the fuzzy match score
+    BONUS = 8
+    MAX_BONUS = 32
+
+    def __init__(self, filename=None):
+        self.filename = filename if filename else get_path(self.FILENAME)
+        # incremented whenever the bonuses change
+        self.version = 0
+
+        # kind -> key -> [count, last_used, rank]
+        self._entries = {kind: dict() for kind in KINDS}
+        # kind -> (version, minute, key -> bonus)
+        self._bonuses = dict()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        data = read_json(self.filename, dict())
+        with self._lock:
+            for kind in KINDS:
+                self._entries[kind] = {
+                    key: list(entry) for key, entry in data.get(kind, {}).items()
+                }
+            self.version += 1
+        logger.debug(f'Loaded usage statistics from "{self.filename}"')
+
+    def record(self, kind, key, timestamp=None):
+        if not key:
+            return
+        timestamp = timestamp if timestamp else time.time()
+        with self._lock:
+            entry = self._entries[kind].setdefault(key, [0, 0, None])
+            entry[0] += 1
+            entry[1] = timestamp
+            entry[2] = add_use(entry[2], timestamp)
+            self.version += 1
+
+            # uses in quick succession are written at once
+            if self._timer is None:
+                self._timer = threading.Timer(self.SAVE_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def bonuses(self, kind, now=None):
+        # returns the bonus of every used key, growing with the logarithm of
+        # the number of uses decayed by their age. The bonuses hardly change
+        # within a minute, so they are only computed once per minute.
+        now = now if now else time.time()
+        version, minute = self.version, int(now // 60)
+        cached = self._bonuses.get(kind)
+        if cached and cached[0] == version and cached[1] == minute:
+            return cached[2]
+
+        with self._lock:
+            bonuses = {
+                key: min(
+                    self.BONUS * math.log2(1 + 2 ** (rank - now / HALF_LIFE)),
+                    self.MAX_BONUS,
+                )
+                for key, (_, _, rank) in self._entries[kind].items()
+            }
+        self._bonuses[kind] = (version, minute, bonuses)
+        return bonuses
+
+    def flush(self):
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            data = {
+                kind: {key: list(entry) for key, entry in entries.items()}
+                for kind, entries in self._entries.items()
+            }
+        write_json(self.filename, data)
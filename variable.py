@@ -1,3 +1,11 @@
+import logging
+import threading
+
+from dispatch import LatestDispatcher
+
+logger = logging.getLogger(__name__)
+
+
 class VariableUpdateListener:
 
     def on_update(self, value):
@@ -7,20 +15,42 @@ class VariableUpdateListener:
 
 class Variable:
 
-    value = ""
-
-    listeners = []
-
-    def notify(self, value):
-        for listener in self.listeners:
-            listener.on_update(value)
+    def __init__(self, value="", name=None):
+        self.value = value
+        self.listeners = []
+        self._lock = threading.Lock()
+        # listeners are notified on a worker thread, rapid updates are
+        # coalesced so that only the latest value is delivered
+        self._dispatcher = LatestDispatcher(self._deliver, name)
+
+    def _deliver(self, item, generation):
+        value, listeners = item
+        for listener in listeners:
+            # a newer value is delivered to every listener anyway
+            self._dispatcher.check(generation)
+            try:
+                listener.on_update(value)
+            except Exception:
+                logger.exception(f"Listener {listener!r} failed")
 
     def get(self):
         return self.value
 
     def set(self, value):
-        self.notify(value)
-        self.value = value
+        # the value is visible right away, only listeners subscribed by now
+        # are notified
+        with self._lock:
+            self.value = value
+            self._dispatcher.submit((value, list(self.listeners)))
 
     def subscribe(self, listener):
-        self.listeners.append(listener)
+        with self._lock:
+            self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self.listeners.remove(listener)
+
+    def flush(self, timeout=None):
+        # waits until the latest value is delivered, returns False on timeout
+        return self._dispatcher.flush(timeout)
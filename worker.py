@@ -0,0 +1,226 @@
+import time
+import uuid
+import logging
+import threading
+
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def notify(summary, body=""):
+    import shutil
+    import subprocess
+
+    # desktop notifications are optional, notify-send may not be installed
+    executable = shutil.which("notify-send")
+    if not executable:
+        return
+    try:
+        subprocess.Popen(
+            [executable, "--app-name=TickTick", summary, body],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError as err:
+        logger.warning(f"Cannot send notification: {err}")
+
+
+def is_transient(status_code):
+    # the request may succeed once retried later
+    return status_code in (401, 408, 429) or status_code >= 500
+
+
+class SubmissionStatus:
+
+    __slots__ = ("ok", "title", "message", "timestamp")
+
+    def __init__(self, ok, title, message):
+        self.ok = ok
+        self.title = title
+        self.message = message
+        self.timestamp = time.monotonic()
+
+
+class SubmissionWorker:
+
+    MAX_WORKERS = 4
+
+    # seconds a status is shown when the keyword is opened
+    STATUS_TTL = 60
+
+    # bounds of the delay between attempts while TickTick is unreachable
+    MIN_RETRY_DELAY = 1
+    MAX_RETRY_DELAY = 60
+
+    def __init__(
+        self,
+        api,
+        outbox,
+        max_workers=MAX_WORKERS,
+        notify=notify,
+        ready=None,
+        on_created=None,
+    ):
+        self.api = api
+        self.outbox = outbox
+        self.notify = notify
+        # called with the data of every task once it is created
+        self.on_created = on_created
+        # tasks are held back while ready() is false, e.g. without a usable
+        # access token
+        self.ready = ready
+        self.statuses = deque(maxlen=5)
+
+        self._retry_at = 0
+        self._retry_delay = 0
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._max_workers = max_workers
+        self._threads = []
+
+    def start(self):
+        # the threads are started on first use, so that replaying the outbox
+        # does not compete with the extension's startup
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self._max_workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"submission-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, data):
+        # the task is journaled before it is sent, a new submission also
+        # ends any pending backoff
+        self.outbox.append(data)
+        self._retry_at = 0
+        self.start()
+
+    def resume(self):
+        # ends any pending backoff, e.g. once a new access token is set
+        self._retry_at = 0
+        self._retry_delay = 0
+        self.outbox.wakeup()
+
+    def submit_many(self, tasks):
+        # tasks of a batch are sent concurrently and reported together once
+        # the last one is done
+        batch = uuid.uuid4().hex
+        for data in tasks:
+            self.submit(dict(data, batch=batch, batch_size=len(tasks)))
+
+    def _create(self, data):
+        return self.api.create_task(
+            data["title"],
+            data["project_id"],
+            data["tags"],
+            data["priority"],
+            data["date"],
+            data["time"],
+            data["timezone"],
+        )
+
+    def _report(self, ok, title, message):
+        self.statuses.append(SubmissionStatus(ok, title, message))
+        if self.notify:
+            self.notify("Task created" if ok else "Task not created", message)
+
+    def _complete(self, data, ok, message, counts):
+        # counts are those of the batch once its last task is done, they are
+        # kept in the outbox across restarts
+        if not data.get("batch"):
+            self._report(ok, data["title"], message)
+            return
+        if counts is None:
+            return
+
+        created, failed = counts
+        message = f"{created} of {data['batch_size']} tasks created"
+        if failed:
+            message += f", {failed} rejected"
+        self._report(not failed, f"{data['batch_size']} tasks", message)
+
+    def _backoff(self, entry_id, title, reason):
+        logger.warning(f'Cannot create task "{title}": {reason}')
+        self.outbox.release(entry_id)
+
+        self._retry_delay = min(
+            max(self._retry_delay * 2, self.MIN_RETRY_DELAY), self.MAX_RETRY_DELAY
+        )
+        self._retry_at = time.monotonic() + self._retry_delay
+
+        # report a task only once while it is waiting in the outbox
+        if entry_id not in self._failed:
+            self._failed.add(entry_id)
+            self._report(False, title, f'"{title}" is queued: {reason}')
+
+    def _send(self, entry_id, data):
+        title = data["title"]
+        try:
+            self.outbox.sync()
+            response = self._create(data)
+        except Exception as err:
+            self._backoff(entry_id, title, err)
+            return
+
+        if response is None:
+            # create_task skips tasks without a title
+            counts = self.outbox.drop(entry_id)
+            self._complete(data, False, "Task without a title", counts)
+        elif response.ok:
+            counts = self.outbox.ack(entry_id)
+            self._retry_delay = 0
+            self._failed.discard(entry_id)
+            if self.on_created:
+                self.on_created(data)
+            self._complete(data, True, f'"{title}"', counts)
+        elif is_transient(response.status_code):
+            self._backoff(entry_id, title, f"HTTP {response.status_code}")
+        else:
+            # the request itself is rejected, retrying will not help
+            logger.warning(f'Task "{title}" rejected: {response.status_code}')
+            counts = self.outbox.drop(entry_id)
+            self._failed.discard(entry_id)
+            self._complete(
+                data, False, f'"{title}": HTTP {response.status_code}', counts
+            )
+
+    def _run(self):
+        while not self._stopped.is_set():
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                self._stopped.wait(min(delay, self.MIN_RETRY_DELAY))
+                continue
+            if self.ready and not self.ready():
+                self._stopped.wait(self.MIN_RETRY_DELAY)
+                continue
+
+            entry = self.outbox.claim(self.MAX_RETRY_DELAY)
+            if entry is None:
+                continue
+            if self._stopped.is_set():
+                self.outbox.release(entry[0])
+                break
+            self._send(*entry)
+
+    def get_statuses(self):
+        now = time.monotonic()
+        return [s for s in self.statuses if now - s.timestamp < self.STATUS_TTL]
+
+    def shutdown(self, timeout=None):
+        # in-flight submissions are completed, pending ones stay in the
+        # outbox for the next start
+        self._stopped.set()
+        self.outbox.wakeup()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            thread.join(remaining)
+        if not any(thread.is_alive() for thread in self._threads):
+            self.outbox.close()